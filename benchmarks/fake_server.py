@@ -0,0 +1,347 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A small, in-process stand-in for a City Hall server.  It implements enough
+of the auth/ and env/ endpoints for the library to be exercised over real
+HTTP, keeping everything in memory.
+"""
+
+from datetime import datetime
+import hashlib
+import json
+import socket
+import threading
+import time
+import uuid
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse, parse_qs
+
+
+def _ok(**kwargs):
+    kwargs['Response'] = 'Ok'
+    return kwargs
+
+
+def _failure(message):
+    return {'Response': 'Failure', 'Message': message}
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self._connections = set()
+        self._threads = []
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(
+            target=self.process_request_thread,
+            args=(request, client_address),
+        )
+        thread.daemon = True
+        with self._connections_lock:
+            self._connections.add(request)
+            self._threads = [t for t in self._threads if t.is_alive()]
+            self._threads.append(thread)
+        thread.start()
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self, timeout=5):
+        """
+        Ends the kept-alive connections handler threads are waiting on, and
+        waits for those threads to finish.
+        """
+        with self._connections_lock:
+            connections = list(self._connections)
+            threads = list(self._threads)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass  # Already closed by the client
+        for thread in threads:
+            thread.join(timeout)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, so without this every reply
+    # on a kept-alive connection waits on the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query, True).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        form = {k: v[-1] for k, v in parse_qs(body, True).items()}
+        cookie = None
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'sessionid':
+                cookie = value
+
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake.error_status is not None and 'auth/' not in url.path:
+            with fake._lock:
+                fake.requests += 1
+            self.send_response(fake.error_status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        reply, new_cookie = fake.handle(
+            method, url.path, query, form, cookie
+        )
+        data = json.dumps(reply, default=str).encode('utf-8')
+        etag = None
+        if fake.etags and method == 'GET' and reply['Response'] == 'Ok':
+            etag = '"{}"'.format(hashlib.md5(data).hexdigest())
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            with fake._lock:
+                fake.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        if new_cookie is not None:
+            self.send_header(
+                'Set-Cookie', 'sessionid={}; Path=/'.format(new_cookie)
+            )
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeCityHall(object):
+    """
+    Serves a fake City Hall on localhost, on a background thread.
+
+        with FakeCityHall() as server:
+            settings = Settings(server.url, 'cityhall', '')
+    """
+
+    def __init__(self, latency=0, default_env='dev', etags=True):
+        """
+        :param latency: seconds to sleep before answering every request
+        :param default_env: the default environment of every user
+        :param etags: if True, replies to GET requests carry an ETag, and
+            requests with a matching If-None-Match get a bodiless 304
+        """
+        self.latency = latency
+        self.default_env = default_env
+        self.etags = etags
+        self.sessions = {}
+        self.values = {}
+        self.requests = 0
+        self.not_modified = 0
+        # If set, every request but logins is answered with this status
+        self.error_status = None
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://{}:{}/api/'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,)
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._server.close_connections()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def expire_sessions(self):
+        """
+        Forgets every logged in session, as if they had timed out
+        """
+        with self._lock:
+            self.sessions.clear()
+
+    def put(self, env, path, value, override='', protect=False,
+            author='cityhall'):
+        """
+        Stores a value directly, without going through HTTP
+        """
+        path = path if path.endswith('/') else path + '/'
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            history = self.values.get((env, path, override), {}).get(
+                'history', []
+            )
+            entry = {
+                'id': entry_id,
+                'value': value,
+                'protect': protect,
+                'history': history,
+            }
+            history.append({
+                'id': entry_id,
+                'override': override,
+                'value': value,
+                'protect': protect,
+                'active': True,
+                'datetime': datetime.now().isoformat(),
+                'name': path.rstrip('/').split('/')[-1],
+                'author': author,
+            })
+            for old in history[:-1]:
+                old['active'] = False
+            self.values[(env, path, override)] = entry
+
+    def handle(self, method, path, query, form, cookie):
+        """
+        :return: the json reply, and the session cookie to set, if any
+        """
+        with self._lock:
+            self.requests += 1
+        prefix = '/api/'
+        if not path.startswith(prefix):
+            return _failure('Unknown url'), None
+        path = path[len(prefix):]
+
+        if path == 'auth/':
+            if method == 'POST':
+                session = uuid.uuid4().hex
+                with self._lock:
+                    self.sessions[session] = form.get('username', '')
+                return _ok(), session
+            if method == 'DELETE':
+                with self._lock:
+                    self.sessions.pop(cookie, None)
+                return _ok(), None
+
+        with self._lock:
+            user = self.sessions.get(cookie)
+        if user is None:
+            return _failure('Not logged in'), None
+
+        if path.startswith('auth/'):
+            return self._auth(method, path[len('auth/'):], form), None
+        if path.startswith('env/'):
+            reply = self._env(method, path[len('env/'):], query, form, user)
+            return reply, None
+        return _failure('Unknown url'), None
+
+    def _auth(self, method, path, form):
+        parts = path.strip('/').split('/')
+        if parts[0] == 'user' and len(parts) == 3 and parts[2] == 'default':
+            if method == 'POST':
+                self.default_env = form.get('env')
+            return _ok(value=self.default_env)
+        if parts[0] == 'user':
+            return _ok(Environments={self.default_env: 4})
+        if parts[0] == 'env':
+            return _ok(Users={'cityhall': 4})
+        if parts[0] == 'grant':
+            return _ok()
+        return _failure('Unknown url')
+
+    def _env(self, method, path, query, form, user):
+        env, _, path = path.partition('/')
+        path = '/' + path
+        override = query.get('override')
+
+        if method == 'POST':
+            with self._lock:
+                current = self.values.get((env, path, override or ''), {})
+            protect = current.get('protect', False)
+            if 'protect' in form:
+                protect = form['protect'] in ('True', 'true', '1')
+            self.put(
+                env, path, form.get('value', current.get('value')),
+                override=override or '', protect=protect, author=user,
+            )
+            return _ok()
+
+        if query.get('viewchildren'):
+            with self._lock:
+                children = [
+                    {
+                        'override': key[2],
+                        'path': key[1],
+                        'id': entry['id'],
+                        'value': entry['value'],
+                        'protect': entry['protect'],
+                        'name': key[1].rstrip('/').split('/')[-1],
+                    }
+                    for key, entry in self.values.items()
+                    if key[0] == env and key[1] != path and
+                    key[1].startswith(path) and
+                    '/' not in key[1][len(path):].rstrip('/')
+                ]
+            return _ok(path=path, children=children)
+
+        with self._lock:
+            preferred = user if override is None else override
+            entry = self.values.get((env, path, preferred))
+            if entry is None:
+                entry = self.values.get((env, path, ''))
+        if entry is None:
+            return _failure('Value does not exist')
+        if query.get('viewhistory'):
+            return _ok(History=list(entry['history']))
+        return _ok(value=entry['value'], protect=entry['protect'])
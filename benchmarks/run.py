@@ -0,0 +1,148 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the library against a local FakeCityHall:
+
+    python -m benchmarks.run --threads 8 --calls 2000
+
+Every call is timed, and the throughput and latency percentiles are
+reported for each scenario, with and without connection reuse.
+"""
+
+from __future__ import print_function
+import argparse
+import threading
+from timeit import default_timer
+from cityhall import Settings, Transport, ValueCache
+from benchmarks.fake_server import FakeCityHall
+
+
+USER = 'cityhall'
+
+
+def measure(func, calls, threads):
+    """
+    Calls func(i) for i in range(calls), spread over 'threads' threads.
+
+    :return: the total wall clock time, and the sorted latencies of the calls
+    """
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(calls))
+
+    def work():
+        mine = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = default_timer()
+            func(i)
+            mine.append(default_timer() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = default_timer()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return default_timer() - start, sorted(latencies)
+
+
+def percentile(latencies, fraction):
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def report(name, reuse, seconds, latencies):
+    print('{:<14} {:<6} {:>10.1f} {:>9.3f} {:>9.3f} {:>9.3f}'.format(
+        name,
+        'yes' if reuse else 'no',
+        len(latencies) / seconds if seconds else 0.0,
+        percentile(latencies, 0.5) * 1000,
+        percentile(latencies, 0.95) * 1000,
+        percentile(latencies, 0.99) * 1000,
+    ))
+
+
+def scenarios(server, settings, transport, keys):
+    """
+    :return: list of (name, func) pairs, where func(i) makes one call
+    """
+    def key(i):
+        return '/bench/key{}'.format(i % keys)
+
+    # Every entry expires at once, so each get() revalidates with an ETag
+    revalidating = Settings(
+        server.url, USER, '', transport=transport, cache=ValueCache(ttl=0)
+    )
+
+    return [
+        ('get', lambda i: settings.get(key(i))),
+        ('revalidate', lambda i: revalidating.get(key(i))),
+        ('get_children', lambda i: settings.get_children('/bench')),
+        ('get_history', lambda i: settings.get_history(key(i))),
+        ('set', lambda i: settings.set('dev', key(i), '', str(i))),
+        ('login', lambda i: Settings(
+            server.url, USER, '', transport=transport
+        ).log_out()),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--threads', type=int, default=8,
+                        help='number of concurrent callers')
+    parser.add_argument('--calls', type=int, default=1000,
+                        help='number of calls made per scenario')
+    parser.add_argument('--keys', type=int, default=50,
+                        help='number of distinct values to read and write')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server waits before replying')
+    parser.add_argument('--only', action='append',
+                        help='only run the named scenario(s)')
+    args = parser.parse_args(argv)
+
+    with FakeCityHall(latency=args.latency) as server:
+        server.put('dev', '/bench', '')
+        for i in range(args.keys):
+            server.put('dev', '/bench/key{}'.format(i), str(i))
+
+        print('{} threads, {} calls per scenario, {} keys, {}s latency'.format(
+            args.threads, args.calls, args.keys, args.latency
+        ))
+        print('{:<14} {:<6} {:>10} {:>9} {:>9} {:>9}'.format(
+            'scenario', 'reuse', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms'
+        ))
+        for reuse in (True, False):
+            transport = Transport(
+                keep_alive=reuse, pool_maxsize=max(10, args.threads)
+            )
+            settings = Settings(server.url, USER, '', transport=transport)
+            for name, func in scenarios(server, settings, transport,
+                                        args.keys):
+                if args.only and name not in args.only:
+                    continue
+                seconds, latencies = measure(func, args.calls, args.threads)
+                report(name, reuse, seconds, latencies)
+            settings.log_out()
+
+
+if __name__ == '__main__':
+    main()
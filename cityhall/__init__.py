@@ -13,8 +13,31 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import requests
-from errors import NotLoggedIn, FailedCall, InvalidCall, NoDefaultEnv
+from requests.cookies import RequestsCookieJar
+from errors import (
+    NotLoggedIn, FailedCall, InvalidCall, NoDefaultEnv, SessionExpired,
+    ServerError, CircuitOpen,
+)
+from cache import (
+    CacheBackend, ValueCache, cache_key, _parent_path, _validate_path
+)
+from shared_cache import SharedCache
+from workers import fan_out, SingleFlight, DEFAULT_WORKERS
+from snapshot import Snapshot, write_snapshot
+from watcher import Watcher
+from transport import Transport
+from stats import Stats
+from decoders import get_decoder, register_decoder, decoder_name
+from resolver import OverrideIndex
+from records import compact, expand, parse_datetime
+from jsonlib import FAST_LOADS, load_reply
+from policy import ReadPolicy, CircuitBreaker, UNAVAILABLE
+from handle import PathHandle
+from env_view import EnvView
 import hashlib
+import os
+import threading
+from timeit import default_timer
 from six import text_type
 
 
@@ -37,40 +60,335 @@ def _hash_password(password):
     return text_type(md5.hexdigest())
 
 
-def _ensure_okay(resp):
+# Failure messages which mean the server no longer knows our session
+_EXPIRED_MESSAGES = ('not logged in', 'not authenticated', 'session expired')
+
+
+def _ensure_okay(resp, loads=None):
+    # Only sent in reply to a conditional request: the cached reply is current
+    if resp.status_code == 304:
+        return None
+    if resp.status_code == 401:
+        raise SessionExpired("Status code 401")
     if resp.status_code != 200:
-        raise FailedCall("Status code not 200: {}".format(resp.status_code))
-    ret = resp.json()
+        raise ServerError("Status code not 200: {}".format(resp.status_code))
+    ret = load_reply(resp, loads)
     if ret['Response'] == 'Ok':
         return ret
-    raise FailedCall(ret.get('Message', 'No message given for failure'))
+    message = ret.get('Message', 'No message given for failure')
+    if any(m in message.lower() for m in _EXPIRED_MESSAGES):
+        raise SessionExpired(message)
+    raise FailedCall(message)
+
+
+def _endpoint(params):
+    """
+    The name calls to env/ are recorded under, given their parameters
+    """
+    if params and params.get('viewchildren'):
+        return 'children'
+    if params and params.get('viewhistory'):
+        return 'history'
+    return 'get'
 
 
-def _validate_path(path):
-    if path[0] != '/' or path.find(' ') > 0:
-        raise InvalidCall("Given path is invalid")
+def _body_size(data):
+    """
+    The length of the body sent for 'data', form encoded as requests does
+    """
+    if data is None:
+        return 0
+    if not isinstance(data, (bytes, text_type)):
+        data = requests.models.RequestEncodingMixin._encode_params(data)
+    return len(data)
+
+
+def _select_rows(children, override):
+    """
+    Given the rows returned by a 'viewchildren' call, pick one row per child
+    path: the one for 'override' if it exists, otherwise the default one.
+
+    :return: dict of child path to the selected row, or None if the child
+        has neither an 'override' nor a default value.
+    """
+    by_path = {}
+    for child in children:
+        by_path.setdefault(child['path'], {})[child['override']] = child
+    selected = {}
+    for path, rows in by_path.items():
+        row = rows.get(override)
+        selected[path] = row if row is not None else rows.get('')
+    return selected
+
+
+def _nest(root, nodes):
+    """
+    Turn a dict of path to value for paths under 'root' into nested dicts of
+    {name: {'value': value, 'children': {...}}}
+    """
+    tree = {}
+    for path in sorted(nodes):
+        level = tree
+        names = path[len(root):].strip('/').split('/')
+        for name in names[:-1]:
+            level = level[name]['children']
+        level[names[-1]] = {'value': nodes[path], 'children': {}}
+    return tree
 
 
 class Settings(object):
-    def __init__(self, url, username, password):
-        self.session = requests.Session()
+    """
+    A session with a City Hall server.
+
+    A Settings can be shared by several threads.  Each thread gets its own
+    requests.Session, but they all share one connection pool and one login.
+    """
+
+    def __init__(self, url, username, password, cache=None, transport=None,
+                 stats=None, lazy=False, relogin=True, json_loads=None,
+                 read_policy=None):
+        """
+        :param url: the url of the City Hall server
+        :param username: the user to log in as
+        :param password: the plaintext password for that user
+        :param cache: optional ValueCache, or other CacheBackend such as a
+            SharedCache. If given, responses to get(), get_history() and
+            get_children() are served from it while they are valid, and
+            set()/set_protect() invalidate what they change.
+        :param transport: optional Transport, to configure connection
+            pooling, keep-alive, timeouts and retries.
+        :param stats: optional Stats, which every call to the server and
+            every cache lookup is recorded with.
+        :param lazy: if True, don't contact the server until it is needed.
+            Logging in happens on the first call that requires it, and the
+            default environment is only retrieved once it is used.  Use
+            prefetch() to do both in the background.
+        :param relogin: if True, when the server reports that the session
+            has expired, log in again and repeat the call.
+        :param json_loads: optional function to decode the raw body of
+            replies with, such as FAST_LOADS: ujson's or simplejson's
+            loads(), if either is installed.  By default requests' own json
+            decoding is used.
+        :param read_policy: optional ReadPolicy, to serve expired values
+            from the cache while they are fetched again, or while the server
+            is unavailable.  Requires a cache, which is made to keep expired
+            values.
+        """
+        if read_policy is not None:
+            if cache is None:
+                raise InvalidCall("A read_policy requires a cache")
+            cache.keep_expired = True
+        self.transport = transport or Transport()
+        self._adapter = self.transport.build_adapter()
+        self._cookies = RequestsCookieJar()
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._inflight = SingleFlight()
+        self._decoded = ValueCache(ttl=float('inf'), max_size=1024)
         self.url = _sanitize_url(url)
         self.name = username
         self.logged_in = False
+        self._passhash = _hash_password(password)
+        self._login_pending = True
+        self._login_generation = 0
+        self.relogin = relogin
+        self._default_env = None
+        self._default_env_known = False
+        self.cache = cache
+        self.snapshot = None
+        self.stats = stats
+        self.listeners = []
+        self.json_loads = json_loads
+        self.read_policy = read_policy
+        self._refreshing = set()
 
-        auth_url = self.url + 'auth/'
-        passhash = _hash_password(password)
-        payload = {'username': self.name, 'passhash': passhash}
-        resp = self.session.post(auth_url, data=payload)
-        _ensure_okay(resp)
+        if not lazy:
+            self._ensure_logged_in()
+            self.get_default_env()
 
+    def _log_in(self):
+        auth_url = self.url + 'auth/'
+        payload = {'username': self.name, 'passhash': self._passhash}
+        self._call('auth', 'post', auth_url, data=payload)
         self.logged_in = True
-        self.default_env = None
-        self.get_default_env()
+        self._login_generation += 1
+
+    def _relogin(self, generation):
+        """
+        Logs in again after the session expired, unless another thread
+        already did since 'generation'.  Only one thread logs in, the others
+        wait for it.
+        """
+        with self._lock:
+            if self.logged_in is None:
+                raise NotLoggedIn()
+            if self._login_generation == generation:
+                self._log_in()
+
+    @property
+    def default_env(self):
+        """
+        The default environment for this user, retrieved the first time it
+        is needed.
+        """
+        if not self._default_env_known:
+            with self._lock:
+                if not self._default_env_known:
+                    self.get_default_env()
+        return self._default_env
+
+    @default_env.setter
+    def default_env(self, env):
+        with self._lock:
+            self._default_env = env
+            self._default_env_known = True
+
+    def prefetch(self):
+        """
+        Logs in and retrieves the default environment in a background
+        thread, for Settings created with lazy=True.  Failures are ignored
+        here, and raised by the first call that needs either.
+
+        :return: the background thread
+        """
+        def warm_up():
+            try:
+                self._ensure_logged_in()
+                self.default_env
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=warm_up)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    @property
+    def session(self):
+        """
+        The requests.Session for the calling thread
+        """
+        self._check_fork()
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.transport.build_session(
+                self._adapter, self._cookies
+            )
+            self._local.session = session
+        return session
+
+    def _check_fork(self):
+        """
+        Called before using the connection pool or locks.  In a process
+        forked after this Settings was created, sockets are still shared with
+        the parent and locks may have been held by threads that don't exist
+        in the child, so they are all replaced.  The login cookie is kept, so
+        the child doesn't need to log in again.
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._inflight = SingleFlight()
+        self._adapter = self.transport.build_adapter()
+        cookies = RequestsCookieJar()
+        cookies.update(self._cookies)
+        self._cookies = cookies
+        if self.cache is not None:
+            self.cache.after_fork()
+        self._decoded.after_fork()
+        if self.stats is not None:
+            self.stats.after_fork()
+        if self.read_policy is not None:
+            self.read_policy.breaker.after_fork()
+            self._refreshing = set()
+
+    def add_listener(self, listener):
+        """
+        Registers a function to be called after every call to the server, as
+        listener(endpoint, seconds, size, error), where size is the length
+        of the response in bytes and error is the exception raised, or None.
+        Listeners are called on the calling thread, and should not raise.
+        """
+        self.listeners.append(listener)
+
+    def _call(self, endpoint, method, url, check=True, etag=False,
+              stats=None, **kwargs):
+        """
+        Makes a call to the server.  If the server reports that the session
+        expired, logs in again and repeats the call once.
+
+        :param endpoint: the name the call is recorded under
+        :param method: the requests.Session method to call
+        :param check: if True, return the json of the response, raising
+            FailedCall if it isn't a success.  Otherwise return the response.
+        :param etag: if True, return the json along with the ETag of the
+            response, or None.  The json is None if the server replied that
+            a conditional request was not modified.
+        :param stats: optional Stats to also record the call with
+        """
+        generation = self._login_generation
+        try:
+            return self._send(
+                endpoint, method, url, check, etag, stats, **kwargs
+            )
+        except SessionExpired:
+            if endpoint == 'auth' or not self.relogin:
+                raise
+        self._relogin(generation)
+        return self._send(endpoint, method, url, check, etag, stats, **kwargs)
+
+    def _send(self, endpoint, method, url, check=True, etag=False,
+              stats=None, **kwargs):
+        """
+        Makes one call to the server, and records it with the stats and
+        listeners.  See _call() for the parameters.
+        """
+        start = default_timer()
+        resp = error = None
+        try:
+            resp = getattr(self.session, method)(url, **kwargs)
+            if not check:
+                return resp
+            json = _ensure_okay(resp, self.json_loads)
+            return (json, resp.headers.get('ETag')) if etag else json
+        except requests.exceptions.RetryError as ex:
+            # The transport retried an error status until it gave up
+            error = ServerError("Retries exhausted: {}".format(ex))
+            raise error
+        except Exception as ex:
+            error = ex
+            raise
+        finally:
+            recorders = self._recorders(stats)
+            if recorders or self.listeners:
+                seconds = default_timer() - start
+                size = 0 if resp is None else len(resp.content)
+                sent = _body_size(kwargs.get('data'))
+                for recorder in recorders:
+                    recorder.record_call(endpoint, seconds, size, error, sent)
+                for listener in self.listeners:
+                    listener(endpoint, seconds, size, error)
+
+    def _recorders(self, stats):
+        """
+        :return: the Stats to record with: this Settings' own, and 'stats'
+            if given
+        """
+        return tuple(s for s in (self.stats, stats) if s is not None)
 
     def _ensure_logged_in(self):
-        if not self.logged_in:
-            raise NotLoggedIn()
+        self._check_fork()
+        if self.logged_in:
+            return
+        with self._lock:
+            if self._login_pending:
+                self._log_in()
+                self._login_pending = False
+            elif not self.logged_in:
+                raise NotLoggedIn()
 
     def get_default_env(self):
         """
@@ -80,9 +398,9 @@ class Settings(object):
         self._ensure_logged_in()
 
         env_url = self.url + 'auth/user/{}/default/'.format(self.name)
-        resp = self.session.get(env_url)
-        env = _ensure_okay(resp)
-        self.default_env = env['value']
+        env = self._call('default_env', 'get', env_url)
+        with self._lock:
+            self.default_env = env['value']
 
     def set_default_env(self, env):
         """
@@ -99,17 +417,19 @@ class Settings(object):
 
         env_url = self.url + 'auth/user/{}/default/'.format(self.name)
         payload = {'env': env}
-        resp = self.session.post(env_url, data=payload)
-        _ensure_okay(resp)
-        self.default_env = env
+        self._call('default_env', 'post', env_url, data=payload)
+        with self._lock:
+            self.default_env = env
 
     def log_out(self):
         """
         Logs the user out. Future calls to the library will raise NotLoggedIn.
         This function is idempotent.
         """
-        if self.logged_in:
-            self.session.delete(self.url + 'auth/')
+        with self._lock:
+            self._login_pending = False
+            if self.logged_in:
+                self._call('auth', 'delete', self.url + 'auth/', check=False)
             self.logged_in = None
 
     def get_env(self, env):
@@ -124,8 +444,7 @@ class Settings(object):
         """
         self._ensure_logged_in()
         env_url = self.url + 'auth/env/' + env + '/'
-        resp = self.session.get(env_url)
-        json = _ensure_okay(resp)
+        json = self._call('env', 'get', env_url)
         return json['Users']
 
     def create_env(self, env):
@@ -137,8 +456,7 @@ class Settings(object):
         """
         self._ensure_logged_in()
         env_url = self.url + 'auth/env/' + env + '/'
-        resp = self.session.post(env_url)
-        _ensure_okay(resp)
+        self._call('env', 'post', env_url)
 
     def get_user(self, user):
         """
@@ -150,8 +468,7 @@ class Settings(object):
         """
         self._ensure_logged_in()
         user_url = self.url + 'auth/user/' + user + '/'
-        resp = self.session.get(user_url)
-        json = _ensure_okay(resp)
+        json = self._call('user', 'get', user_url)
         return json['Environments']
 
     def create_user(self, user, password):
@@ -164,8 +481,7 @@ class Settings(object):
         self._ensure_logged_in()
         user_url = self.url + 'auth/user/' + user + '/'
         payload = {'passhash': _hash_password(password)}
-        resp = self.session.post(user_url, data=payload)
-        _ensure_okay(resp)
+        self._call('user', 'post', user_url, data=payload)
 
     def update_password(self, password):
         """
@@ -176,8 +492,7 @@ class Settings(object):
         self._ensure_logged_in()
         user_url = self.url + 'auth/user/' + self.name + '/'
         payload = {'passhash': _hash_password(password)}
-        resp = self.session.put(user_url, data=payload)
-        _ensure_okay(resp)
+        self._call('user', 'put', user_url, data=payload)
 
     def delete_user(self, user):
         """
@@ -190,8 +505,7 @@ class Settings(object):
         """
         self._ensure_logged_in()
         user_url = self.url + 'auth/user/' + user + '/'
-        resp = self.session.delete(user_url)
-        _ensure_okay(resp)
+        self._call('user', 'delete', user_url)
 
     def grant_rights(self, env, user, rights):
         """
@@ -220,43 +534,517 @@ class Settings(object):
         self._ensure_logged_in()
         grant_url = self.url + 'auth/grant/'
         payload = {'user': user, 'env': env, 'rights': rights}
-        resp = self.session.post(grant_url, data=payload)
-        _ensure_okay(resp)
+        self._call('grant', 'post', grant_url, data=payload)
+
+    def _get_raw(self, env, path, params, stats=None, fresh=False):
+        """
+        :param fresh: if True, always call the server, bypassing the cache
+            and the read_policy.  The reply still replaces the cached one.
+        """
+        _validate_path(path)
+        self._ensure_logged_in()
+        env = env or self.default_env
+        if env is None:
+            raise NoDefaultEnv()
+
+        key = cache_key(env, path, params)
+        if fresh:
+            get_url = self.url + 'env/' + env + key[1]
+            return self._inflight.do(
+                key, lambda: self._fetch(key, get_url, params, stats)
+            )
+        return self._read(key, params, stats=stats)
+
+    def _read(self, key, params, get_url=None, stats=None):
+        """
+        Reads the reply for a key from the cache, or else from the server
+
+        :param get_url: the url to call, if already known
+        :param stats: optional Stats to also record the cache lookup, and
+            any call made, with
+        """
+        if self.cache is not None:
+            json = self.cache.get(key)
+            for recorder in self._recorders(stats):
+                recorder.record_cache(json is not None)
+            if json is not None:
+                return json
+
+        # Identical reads made at the same time share one call to the server
+        if get_url is None:
+            get_url = self.url + 'env/' + key[0] + key[1]
+        fetch = lambda: self._inflight.do(
+            key, lambda: self._fetch_once(key, get_url, params, stats)
+        )
+        if self.read_policy is None:
+            return fetch()
+        return self._read_with_policy(key, fetch, stats)
+
+    def _read_with_policy(self, key, fetch, stats=None):
+        """
+        Applies the read_policy to a value missing from the cache, or
+        expired.  See ReadPolicy.
+        """
+        policy = self.read_policy
+        expired = self.cache.get_expired(key)
+        if expired is not None and policy.stale_while_revalidate:
+            self._refresh_in_background(key, fetch)
+            self._served_stale(stats)
+            return expired[0]
+
+        try:
+            if not policy.breaker.allow():
+                raise CircuitOpen("Not calling the server after failures")
+            return policy.call(fetch)
+        except UNAVAILABLE + (CircuitOpen,):
+            if expired is None or not policy.stale_if_error:
+                raise
+        self._served_stale(stats)
+        return expired[0]
+
+    def _refresh_in_background(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                if self.read_policy.breaker.allow():
+                    self.read_policy.call(fetch)
+            except Exception:
+                pass  # Recorded by the policy, and the stale value remains
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def _served_stale(self, stats=None):
+        for recorder in self._recorders(stats):
+            recorder.record_stale()
+
+    def _fetch(self, key, url, params, stats=None):
+        endpoint = _endpoint(params)
+        if self.cache is None:
+            return self._call(
+                endpoint, 'get', url, stats=stats, params=params
+            )
+
+        # An expired reply the server gave an ETag for is revalidated, so
+        # that if it is unchanged, only headers are sent back
+        kwargs = {'params': params}
+        expired = self.cache.get_expired(key)
+        old_etag = None if expired is None else expired[1]
+        if old_etag is not None:
+            kwargs['headers'] = {'If-None-Match': old_etag}
+        json, etag = self._call(
+            endpoint, 'get', url, etag=True, stats=stats, **kwargs
+        )
+        if old_etag is not None:
+            for recorder in self._recorders(stats):
+                recorder.record_revalidation(json is not None)
+        if json is None:
+            self.cache.refresh(key)
+            return expired[0]
+
+        # Plain values are cached as the reply itself
+        if endpoint != 'get':
+            json = compact(json)
+        self.cache.set(key, json, etag)
+        return json
+
+    def _fetch_once(self, key, url, params, stats=None):
+        """
+        Fetches a value missing from the cache, unless another process
+        sharing the cache stored it while this one waited for its lock.
+        """
+        if self.cache is None:
+            return self._fetch(key, url, params, stats)
+        with self.cache.lock(key):
+            json = self.cache.get(key)
+            if json is None:
+                json = self._fetch(key, url, params, stats)
+        return json
+
+    def env(self, name):
+        """
+        Returns an EnvView, to read and write the values of environment
+        'name' without passing it to every call.
+        """
+        return EnvView(self, name)
 
-    def _get_raw(self, env, path, params):
+    def path(self, env, path, override=None):
+        """
+        Returns a PathHandle for reading and writing 'path' repeatedly.  The
+        path is validated, and its urls and parameters are built, only once.
+
+        :param env: the environment, or None for the default one at the time
+            of this call
+        """
         _validate_path(path)
         self._ensure_logged_in()
         env = env or self.default_env
         if env is None:
             raise NoDefaultEnv()
-        get_url = _sanitize_url(self.url + 'env/' + env + path)
-        resp = self.session.get(get_url, params=params)
-        return _ensure_okay(resp)
+        url = _sanitize_url(self.url + 'env/' + env + path)
+        return PathHandle(self, env, path, override, url)
 
     def get(self, path, env=None, override=None, view_raw=False):
+        snapshot = self.snapshot
+        # logged_in is None once logged out, and False until a lazy login
+        use_snapshot = (
+            snapshot is not None and not view_raw and
+            self.logged_in is not None
+        )
+        if use_snapshot:
+            # Don't ask the server for the default env while the snapshot
+            # can answer: it may be unreachable
+            snapshot_env = env
+            if not snapshot_env:
+                snapshot_env = (
+                    self._default_env if self._default_env_known
+                    else snapshot.env
+                )
+            if snapshot.covers(snapshot_env, path, override):
+                found, value = snapshot.lookup(path)
+                if found:
+                    return value
         params = None if override is None else {'override': override}
         json = self._get_raw(env, path, params)
         return json if view_raw else json['value']
 
+    def resolve(self, path, env=None, override=None, view_raw=False):
+        """
+        Retrieves a value like get(), but resolves the override locally.
+
+        The first call for a path fetches every child of its parent, with
+        all of their overrides, in one 'viewchildren' call, and indexes them
+        in the cache.  Later calls for any of those children, under any
+        override, are answered from that index, using the default value when
+        there is none for the override.  The index expires and is
+        invalidated along with the rest of the cache.
+
+        If override is None, the current user's override is used.
+
+        :param view_raw: if True, return the whole 'viewchildren' row
+        """
+        _validate_path(path)
+        if self.cache is None:
+            raise InvalidCall("resolve() requires a cache")
+        self._ensure_logged_in()
+        env = env or self.default_env
+        if env is None:
+            raise NoDefaultEnv()
+
+        parent = _parent_path(_sanitize_url(path))
+        row = None
+        if parent is not None:
+            key = cache_key(env, parent, {'viewoverrides': True})
+            index = self.cache.get(key)
+            if index is None:
+                index = self._inflight.do(
+                    key, lambda: self._index_overrides(key, env, parent)
+                )
+            preferred = self.name if override is None else override
+            row = index.lookup(path, preferred)
+        if row is None:
+            return self.get(path, env=env, override=override,
+                            view_raw=view_raw)
+        return row.as_dict() if view_raw else row.value
+
+    def _index_overrides(self, key, env, parent):
+        index = OverrideIndex(self._children(parent, env, None))
+        self.cache.set(key, index)
+        return index
+
+    def get_as(self, decoder, path, env=None, override=None):
+        """
+        Retrieves a value, and decodes it.  For registered decoders, the
+        decoded value is remembered along with the raw one, and reused for
+        as long as the raw value doesn't change, so it should not be
+        modified.  Only the most recently used values are remembered.
+
+        :param decoder: 'int', 'float', 'bool', 'json', 'duration', a name
+            given to register_decoder(), or a function taking the raw value
+        :raises ValueError: if the value can't be decoded
+        """
+        func = get_decoder(decoder)
+        raw = self.get(path, env=env, override=override)
+        name = decoder_name(decoder)
+        if name is None:
+            return func(raw)
+
+        key = cache_key(
+            env or self.default_env, path,
+            {'decoder': name, 'override': override}
+        )
+        # The name may since have been registered again with another function
+        memo = self._decoded.get(key)
+        if memo is not None and memo[0] == raw and memo[1] is func:
+            return memo[2]
+        value = func(raw)
+        self._decoded.set(key, (raw, func, value))
+        return value
+
+    def get_int(self, path, env=None, override=None):
+        return self.get_as('int', path, env, override)
+
+    def get_float(self, path, env=None, override=None):
+        return self.get_as('float', path, env, override)
+
+    def get_bool(self, path, env=None, override=None):
+        return self.get_as('bool', path, env, override)
+
+    def get_json(self, path, env=None, override=None):
+        return self.get_as('json', path, env, override)
+
+    def get_duration(self, path, env=None, override=None):
+        """
+        :return: datetime.timedelta for values such as '30s', '5m' or '1h'
+        """
+        return self.get_as('duration', path, env, override)
+
     def get_history(self, path, env=None, override=None):
         params = {} if override is None else {'override': override}
         params['viewhistory'] = True
-        json = self._get_raw(env, path, params)
-        return json['History']
+        return expand(self._get_raw(env, path, params)['History'])
+
+    def iter_history(self, path, env=None, override=None, limit=None,
+                     since_id=None, since=None):
+        """
+        Yields the history of a value, newest entry (highest id) first,
+        stopping as soon as an entry falls outside the filters.  The server
+        has no paging, so the history is still fetched in one call (and
+        cached, if there is a cache), but entries are only turned into dicts
+        as they are consumed.
+
+        :param limit: maximum number of entries to yield
+        :param since_id: only yield entries with an id greater than this
+        :param since: datetime; only yield entries made after this
+        """
+        if limit is not None and limit <= 0:
+            return
+        params = {} if override is None else {'override': override}
+        params['viewhistory'] = True
+        history = self._get_raw(env, path, params)['History']
+
+        # Usually already oldest first, which sorting barely costs
+        count = 0
+        for entry in sorted(history, key=lambda e: e['id'], reverse=True):
+            if since_id is not None and entry['id'] <= since_id:
+                return
+            if since is not None and \
+                    parse_datetime(entry['datetime']) <= since:
+                return
+            yield expand([entry])[0]
+            count += 1
+            if count == limit:
+                return
 
     def get_children(self, path, env=None, override=None):
+        return expand(self._children(path, env, override))
+
+    def _children(self, path, env, override, stats=None, fresh=False):
+        """
+        :return: the rows of a 'viewchildren' reply, as records if they came
+            through the cache.  These are shared, and must not be modified.
+        """
         params = {} if override is None else {'override': override}
         params['viewchildren'] = True
-        json = self._get_raw(env, path, params)
-        return json['children']
+        return self._get_raw(env, path, params, stats, fresh)['children']
+
+    def get_many(self, paths, env=None, override=None,
+                 max_workers=DEFAULT_WORKERS):
+        """
+        Retrieves the values of several paths at once.  The calls are made
+        concurrently, sharing the session's connection pool.
+
+        A failure for one path does not stop the others: the exception
+        raised for that path is returned as its value instead.
+
+        :param paths: list of paths to retrieve
+        :param max_workers: maximum number of concurrent calls
+        :return: dict of path to value, or to the exception raised for it
+        """
+        self._ensure_logged_in()
+        paths = list(paths)
+        results = fan_out(
+            lambda p: self.get(p, env=env, override=override),
+            paths,
+            max_workers,
+        )
+        return {
+            path: value if error is None else error
+            for path, (value, error) in zip(paths, results)
+        }
+
+    def get_tree(self, path, env=None, override=None, flat=False,
+                 max_workers=DEFAULT_WORKERS):
+        """
+        Retrieves every value under 'path'.  The tree is walked breadth
+        first using 'viewchildren' calls, and all the calls for one level
+        are made concurrently.
+
+        For each child, the value for 'override' is used if it exists,
+        otherwise the default value.  If override is None, the current
+        user's override is used, mirroring get().  Children that have no
+        such value are reported with a value of None.
+
+        :param flat: if True, return a dict of path to value for every
+            descendant of 'path'.  Otherwise return nested dicts of
+            {name: {'value': value, 'children': {...}}}
+        :param max_workers: maximum number of concurrent calls
+        """
+        return self._tree(path, env, override, flat, max_workers)
+
+    def _tree(self, path, env, override, flat, max_workers, stats=None,
+              fresh=False):
+        root = _sanitize_url(path)
+        rows = self._walk_tree(
+            path, env, override, max_workers, stats, fresh
+        )
+        nodes = {
+            child_path: None if row is None else row['value']
+            for child_path, row in rows.items()
+        }
+        return nodes if flat else _nest(root, nodes)
+
+    def _walk_tree(self, path, env, override, max_workers, stats=None,
+                   fresh=False):
+        """
+        :return: dict of path to the selected 'viewchildren' row, or None,
+            for every descendant of 'path'.  See get_tree()
+        :param fresh: see _get_raw()
+        """
+        _validate_path(path)
+        self._ensure_logged_in()
+        env = env or self.default_env
+        if env is None:
+            raise NoDefaultEnv()
+        preferred = self.name if override is None else override
+
+        root = _sanitize_url(path)
+        nodes = {}
+        level = [root]
+        while level:
+            results = fan_out(
+                lambda p: self._children(p, env, override, stats, fresh),
+                level,
+                max_workers,
+            )
+            next_level = []
+            for children, error in results:
+                if error is not None:
+                    raise error
+                rows = _select_rows(children, preferred)
+                for child_path, row in rows.items():
+                    if child_path in nodes or child_path == root:
+                        continue
+                    nodes[child_path] = row
+                    next_level.append(child_path)
+            level = next_level
+        return nodes
+
+    def preload(self, path, env=None, override=None):
+        """
+        Fills the cache with every value under 'path', so that get() for
+        them is answered from memory.  Calling this before forking worker
+        processes lets them all start with a warm cache, shared with the
+        parent through copy-on-write.
+        """
+        self._preload(path, env, override)
+
+    def _preload(self, path, env, override, stats=None):
+        if self.cache is None:
+            raise InvalidCall("preload() requires a cache")
+        env = env or self.default_env
+        params = None if override is None else {'override': override}
+        rows = self._walk_tree(path, env, override, DEFAULT_WORKERS, stats)
+        for child_path, row in rows.items():
+            if row is not None:
+                json = {
+                    'Response': 'Ok',
+                    'value': row['value'],
+                    'protect': row['protect'],
+                }
+                self.cache.set(cache_key(env, child_path, params), json)
+
+    def export_snapshot(self, filename, path, env=None, override=None):
+        """
+        Saves every value under 'path' to a snapshot file, which can later
+        be passed to load_snapshot().
+
+        :param filename: the file to write to.  It is replaced atomically.
+        """
+        env = env or self.default_env
+        values = self.get_tree(path, env=env, override=override, flat=True)
+        write_snapshot(filename, env, path, override, values)
+
+    def load_snapshot(self, filename, refresh=True):
+        """
+        Serves get() from a snapshot file written by export_snapshot(), for
+        the environment, path and override it was exported with.  The file
+        is memory-mapped, so only the values that are read are parsed.
+
+        :param refresh: if True, the subtree is fetched from the server in
+            a background thread.  Once that succeeds, the snapshot file is
+            rewritten with the fresh values and get() goes back to using the
+            server.  If it fails, the snapshot keeps being used.
+        :return: the refresh thread, or None
+        """
+        snapshot = Snapshot(filename)
+        previous, self.snapshot = self.snapshot, snapshot
+        if previous is not None:
+            previous.close()
+        if not refresh:
+            return None
+
+        def reconcile():
+            try:
+                self.export_snapshot(
+                    filename, snapshot.path, snapshot.env, snapshot.override
+                )
+            except Exception:
+                return
+            self._drop_snapshot(snapshot)
+
+        thread = threading.Thread(target=reconcile)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _drop_snapshot(self, snapshot):
+        """
+        Stops serving get() from 'snapshot', unless it was already replaced
+        """
+        with self._lock:
+            if self.snapshot is snapshot:
+                self.snapshot = None
+        snapshot.close()
 
     def _set_raw(self, env, path, override, payload):
         _validate_path(path)
         self._ensure_logged_in()
-        set_url = _sanitize_url(self.url + 'env/' + env + path)
-        params = {'override': override}
-        resp = self.session.post(set_url, data=payload, params=params)
-        _ensure_okay(resp)
+        self._post_value(env, path, override, payload)
+
+    def _post_value(self, env, path, override, payload, set_url=None,
+                    params=None, stats=None):
+        if set_url is None:
+            set_url = _sanitize_url(self.url + 'env/' + env + path)
+            params = {'override': override}
+        self._call(
+            'set', 'post', set_url, stats=stats, data=payload, params=params
+        )
+        if self.cache is not None:
+            self.cache.invalidate(env, path)
+        # The snapshot would keep serving the old value
+        snapshot = self.snapshot
+        if snapshot is not None and env == snapshot.env and \
+                _sanitize_url(path).startswith(snapshot.path):
+            self._drop_snapshot(snapshot)
 
     def set(self, env, path, override, value):
         payload = {'value': value}
@@ -265,3 +1053,37 @@ class Settings(object):
     def set_protect(self, env, path, override, protect):
         payload = {'protect': protect}
         self._set_raw(env, path, override, payload)
+
+    def set_many(self, env, items, protect=False,
+                 max_workers=DEFAULT_WORKERS):
+        """
+        Sets several values at once.  Every item is validated before anything
+        is sent, and then the writes are made concurrently.
+
+        :param env: the environment to write to
+        :param items: list of (path, override, value) tuples
+        :param protect: if True, the third element of each item is the
+            protect flag to set, as with set_protect(), instead of the value
+        :param max_workers: maximum number of concurrent calls
+        :return: list of (path, override, error) tuples, in the order of
+            items, where error is the exception raised for that item, or None
+        """
+        if not isinstance(env, (text_type, str)):
+            raise InvalidCall("Environment must be a string")
+        items = list(items)
+        for path, _, _ in items:
+            _validate_path(path)
+        self._ensure_logged_in()
+
+        field = 'protect' if protect else 'value'
+        results = fan_out(
+            lambda item: self._post_value(
+                env, item[0], item[1], {field: item[2]}
+            ),
+            items,
+            max_workers,
+        )
+        return [
+            (path, override, error)
+            for (path, override, _), (_, error) in zip(items, results)
+        ]
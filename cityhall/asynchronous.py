@@ -0,0 +1,117 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from multiprocessing.pool import ThreadPool
+from cityhall import Settings, _validate_path
+from workers import DEFAULT_WORKERS
+
+
+def gather(*results, **kwargs):
+    """
+    Wait for the given results of AsyncSettings calls.
+
+    :param timeout: optional number of seconds to wait for each result
+    :return: list of their values, in order.  If any call failed, its
+        exception is raised.
+    """
+    timeout = kwargs.get('timeout')
+    return [result.get(timeout) for result in results]
+
+
+class AsyncSettings(object):
+    """
+    A counterpart to Settings whose calls do not block the caller.
+
+    Logging in happens when this is created.  Every other call is handed to
+    a pool of worker threads which share one Settings, and so one session
+    and its connection pool, and returns an AsyncResult.  Call .get() on it
+    to wait for the value, or pass several to gather() to wait for them
+    together.  Failures are raised from .get() with the same exceptions
+    Settings raises.  Invalid paths are rejected right away.
+    """
+
+    def __init__(self, url, username, password,
+                 max_workers=DEFAULT_WORKERS, **kwargs):
+        """
+        :param max_workers: number of calls that can be in flight at once
+        :param kwargs: passed on to Settings
+        """
+        self.settings = Settings(url, username, password, **kwargs)
+        self._pool = ThreadPool(max_workers)
+
+    @property
+    def default_env(self):
+        return self.settings.default_env
+
+    def _submit(self, func, *args):
+        return self._pool.apply_async(func, args)
+
+    def close(self):
+        """
+        Waits for calls in flight, and stops the worker threads.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def get_default_env(self):
+        return self._submit(self.settings.get_default_env)
+
+    def set_default_env(self, env):
+        return self._submit(self.settings.set_default_env, env)
+
+    def log_out(self):
+        return self._submit(self.settings.log_out)
+
+    def get_env(self, env):
+        return self._submit(self.settings.get_env, env)
+
+    def create_env(self, env):
+        return self._submit(self.settings.create_env, env)
+
+    def get_user(self, user):
+        return self._submit(self.settings.get_user, user)
+
+    def create_user(self, user, password):
+        return self._submit(self.settings.create_user, user, password)
+
+    def update_password(self, password):
+        return self._submit(self.settings.update_password, password)
+
+    def delete_user(self, user):
+        return self._submit(self.settings.delete_user, user)
+
+    def grant_rights(self, env, user, rights):
+        return self._submit(self.settings.grant_rights, env, user, rights)
+
+    def get(self, path, env=None, override=None, view_raw=False):
+        _validate_path(path)
+        return self._submit(self.settings.get, path, env, override, view_raw)
+
+    def get_history(self, path, env=None, override=None):
+        _validate_path(path)
+        return self._submit(self.settings.get_history, path, env, override)
+
+    def get_children(self, path, env=None, override=None):
+        _validate_path(path)
+        return self._submit(self.settings.get_children, path, env, override)
+
+    def set(self, env, path, override, value):
+        _validate_path(path)
+        return self._submit(self.settings.set, env, path, override, value)
+
+    def set_protect(self, env, path, override, protect):
+        _validate_path(path)
+        return self._submit(
+            self.settings.set_protect, env, path, override, protect
+        )
@@ -0,0 +1,231 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import threading
+import time
+from errors import InvalidCall
+
+
+def _validate_path(path):
+    if path[0] != '/' or path.find(' ') > 0:
+        raise InvalidCall("Given path is invalid")
+
+
+def _normalize_path(path):
+    return path if path[-1] == '/' else path + '/'
+
+
+def _parent_path(path):
+    """
+    Return the parent of a normalized path, or None for the root.
+    '/abc/val1/' -> '/abc/'
+    """
+    if path == '/':
+        return None
+    return path[:path.rstrip('/').rfind('/') + 1]
+
+
+def cache_key(env, path, params):
+    """
+    Build the key under which a call to env/<env><path> with the given
+    query parameters is cached.
+    """
+    flags = tuple(sorted(params.items())) if params else ()
+    return env, _normalize_path(path), flags
+
+
+class _NoLock(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class CacheBackend(object):
+    """
+    The interface of the caches a Settings can use.  Keys are built with
+    cache_key(), and values are replies from the server, or other objects
+    Settings derives from them.
+
+    Backends shared between processes also make sure only one of them
+    fetches a missing value at a time, through lock().
+    """
+
+    ttl = 60
+    keep_expired = False
+
+    def get(self, key):
+        """
+        Return the value stored for key, or None if there isn't one or it
+        has expired.
+        """
+        raise NotImplementedError()
+
+    def get_expired(self, key):
+        """
+        :return: the value and ETag (or None) stored for key, whether or not
+            it has expired, or None if no value that can be revalidated or
+            served stale is stored for it
+        """
+        raise NotImplementedError()
+
+    def set(self, key, value, etag=None):
+        """
+        :param etag: the ETag the server sent with the value, if any
+        """
+        raise NotImplementedError()
+
+    def refresh(self, key):
+        """
+        Starts the ttl of an entry over, once the server confirmed it is
+        still current
+        """
+        raise NotImplementedError()
+
+    def invalidate(self, env, path):
+        """
+        Drop every entry for 'path' in 'env', regardless of override or
+        view flags, along with the children listing of its parent.
+        """
+        raise NotImplementedError()
+
+    def invalidate_env(self, env):
+        """
+        Drop every entry for 'env'
+        """
+        raise NotImplementedError()
+
+    def lock(self, key):
+        """
+        :return: a context manager held while fetching the value for key.
+            Within one process, concurrent fetches are already coalesced,
+            so by default this does nothing.
+        """
+        return _NoLock()
+
+    def after_fork(self):
+        pass
+
+    def clear(self):
+        raise NotImplementedError()
+
+
+class ValueCache(CacheBackend):
+    """
+    An in-process cache for responses retrieved from City Hall.
+
+    Entries expire 'ttl' seconds after they are stored.  Once more than
+    'max_size' entries are held, the least recently used one is evicted.
+    Cached responses are shared between callers, and should be treated as
+    read-only.  Entries stored with an ETag, or all entries if
+    'keep_expired' is set, are kept once they expire, until they are
+    evicted, so that they can be revalidated with the server instead of
+    fetched again, or served stale.  A cache holds values as seen by one
+    user, so it should not be shared between Settings logged in as
+    different users.
+    """
+
+    def __init__(self, ttl=60, max_size=1024, keep_expired=False):
+        """
+        :param ttl: seconds an entry is considered valid for
+        :param max_size: maximum number of entries held
+        :param keep_expired: if True, keep entries without an ETag once they
+            expire as well
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.keep_expired = keep_expired
+        self._entries = OrderedDict()
+        self._by_path = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires, etag = entry
+            if expires <= time.time():
+                if etag is None and not self.keep_expired:
+                    self._remove(key)
+                return None
+            del self._entries[key]
+            self._entries[key] = entry
+            return value
+
+    def get_expired(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, _, etag = entry
+            if etag is None and not self.keep_expired:
+                return None
+            return value, etag
+
+    def set(self, key, value, etag=None):
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            self._entries[key] = (value, time.time() + self.ttl, etag)
+            self._by_path.setdefault(key[:2], set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def refresh(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, etag = entry
+                del self._entries[key]
+                self._entries[key] = (value, time.time() + self.ttl, etag)
+
+    def invalidate(self, env, path):
+        path = _normalize_path(path)
+        with self._lock:
+            for prefix in ((env, path), (env, _parent_path(path))):
+                for key in list(self._by_path.get(prefix, ())):
+                    self._remove(key)
+
+    def invalidate_env(self, env):
+        with self._lock:
+            for prefix in [p for p in self._by_path if p[0] == env]:
+                for key in list(self._by_path.get(prefix, ())):
+                    self._remove(key)
+
+    def after_fork(self):
+        """
+        Replaces the lock in a forked child, where it could have been held
+        by a thread which doesn't exist there.  Entries are kept.
+        """
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_path.clear()
+
+    def _remove(self, key):
+        del self._entries[key]
+        keys = self._by_path.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_path[key[:2]]
@@ -0,0 +1,94 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import timedelta
+import json
+import re
+from errors import InvalidCall
+
+
+_TRUE = ('true', 'yes', 'on', '1')
+_FALSE = ('false', 'no', 'off', '0', '')
+
+_DURATION = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)?\s*$')
+_DURATION_UNITS = {
+    'ms': 0.001, 's': 1, None: 1, 'm': 60, 'h': 3600, 'd': 86400
+}
+
+
+def decode_bool(raw):
+    value = raw.strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError("Not a boolean: {!r}".format(raw))
+
+
+def decode_duration(raw):
+    """
+    Decodes durations such as '250ms', '30s', '5m', '1h' or '2d'.  Plain
+    numbers are taken to be seconds.
+
+    :return: datetime.timedelta
+    """
+    match = _DURATION.match(raw)
+    if match is None:
+        raise ValueError("Not a duration: {!r}".format(raw))
+    amount, unit = match.groups()
+    return timedelta(seconds=float(amount) * _DURATION_UNITS[unit])
+
+
+_decoders = {
+    'int': int,
+    'float': float,
+    'bool': decode_bool,
+    'json': json.loads,
+    'duration': decode_duration,
+}
+
+
+def register_decoder(name, decoder):
+    """
+    Makes a decoder available to Settings.get_as() under 'name'.
+
+    :param decoder: a function taking the raw string value, and returning
+        the decoded value or raising ValueError
+    """
+    _decoders[name] = decoder
+
+
+def decoder_name(decoder):
+    """
+    :return: the name a decoder is registered under, or None if it is a
+        function which isn't registered
+    """
+    if not callable(decoder):
+        return decoder
+    for name, func in _decoders.items():
+        if func is decoder:
+            return name
+    return None
+
+
+def get_decoder(decoder):
+    """
+    :param decoder: a registered name, or a function
+    """
+    if callable(decoder):
+        return decoder
+    try:
+        return _decoders[decoder]
+    except KeyError:
+        raise InvalidCall("Unknown decoder: {!r}".format(decoder))
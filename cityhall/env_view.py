@@ -0,0 +1,106 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cache import cache_key, _normalize_path, _validate_path
+from records import expand
+from stats import Stats
+from workers import DEFAULT_WORKERS
+
+
+class EnvView(object):
+    """
+    A Settings scoped to one environment.  It shares the session, login and
+    cache of its Settings, but keeps its own Stats, which the cache lookups
+    and calls to the server made through it are recorded with, as well as
+    with the Settings' own.  Its entries in the cache can be dropped or
+    warmed up all at once.  Get one from Settings.env().
+    """
+
+    def __init__(self, settings, env):
+        self.settings = settings
+        self.name = env
+        self.prefix = settings.url + 'env/' + env
+        self.stats = Stats()
+
+    def __repr__(self):
+        return 'EnvView({!r})'.format(self.name)
+
+    def _read(self, path, params):
+        _validate_path(path)
+        self.settings._ensure_logged_in()
+        key = cache_key(self.name, path, params)
+        return self.settings._read(
+            key, params, self.prefix + key[1], self.stats
+        )
+
+    def get(self, path, override=None, view_raw=False):
+        if self.settings.snapshot is not None:
+            return self.settings.get(path, self.name, override, view_raw)
+        params = None if override is None else {'override': override}
+        json = self._read(path, params)
+        return json if view_raw else json['value']
+
+    def get_history(self, path, override=None):
+        params = {} if override is None else {'override': override}
+        params['viewhistory'] = True
+        return expand(self._read(path, params)['History'])
+
+    def get_children(self, path, override=None):
+        params = {} if override is None else {'override': override}
+        params['viewchildren'] = True
+        return expand(self._read(path, params)['children'])
+
+    def get_tree(self, path, override=None, flat=False,
+                 max_workers=DEFAULT_WORKERS):
+        """
+        See Settings.get_tree()
+        """
+        return self.settings._tree(
+            path, self.name, override, flat, max_workers, self.stats
+        )
+
+    def path(self, path, override=None):
+        """
+        :return: a PathHandle for 'path' in this environment
+        """
+        return self.settings.path(self.name, path, override)
+
+    def _write(self, path, override, payload):
+        _validate_path(path)
+        self.settings._ensure_logged_in()
+        url = self.prefix + _normalize_path(path)
+        self.settings._post_value(
+            self.name, path, override, payload, url, {'override': override},
+            self.stats
+        )
+
+    def set(self, path, override, value):
+        self._write(path, override, {'value': value})
+
+    def set_protect(self, path, override, protect):
+        self._write(path, override, {'protect': protect})
+
+    def invalidate(self):
+        """
+        Drops every cached value of this environment
+        """
+        if self.settings.cache is not None:
+            self.settings.cache.invalidate_env(self.name)
+
+    def warm(self, path='/', override=None):
+        """
+        Fills the cache with every value of this environment under 'path'.
+        See Settings.preload()
+        """
+        self.settings._preload(path, self.name, override, self.stats)
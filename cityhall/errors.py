@@ -27,3 +27,15 @@ class InvalidCall(FailedCall):
 
 class NoDefaultEnv(FailedCall):
     pass
+
+
+class SessionExpired(FailedCall):
+    pass
+
+
+class ServerError(FailedCall):
+    pass
+
+
+class CircuitOpen(FailedCall):
+    pass
@@ -0,0 +1,85 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cache import cache_key
+from records import expand
+
+
+def _with_flag(params, flag):
+    params = dict(params or {})
+    params[flag] = True
+    return params
+
+
+class PathHandle(object):
+    """
+    One path, in one environment and for one override, ready to be read and
+    written without validating it or building its url and parameters again.
+    Get one from Settings.path().
+    """
+
+    def __init__(self, settings, env, path, override, url):
+        """
+        :param url: the url for 'path' in 'env'
+        """
+        self.settings = settings
+        self.env = env
+        self.path = path
+        self.override = override
+        self.url = url
+
+        params = None if override is None else {'override': override}
+        self._get = self._prepare(params)
+        self._history = self._prepare(_with_flag(params, 'viewhistory'))
+        self._children = self._prepare(_with_flag(params, 'viewchildren'))
+        self._set_params = {'override': override}
+
+    def _prepare(self, params):
+        return cache_key(self.env, self.path, params), params
+
+    def __repr__(self):
+        return 'PathHandle({!r}, {!r}, {!r})'.format(
+            self.env, self.path, self.override
+        )
+
+    def _read(self, prepared):
+        self.settings._ensure_logged_in()
+        key, params = prepared
+        return self.settings._read(key, params, self.url)
+
+    def get(self, view_raw=False):
+        settings = self.settings
+        if settings.snapshot is not None:
+            return settings.get(self.path, self.env, self.override, view_raw)
+        json = self._read(self._get)
+        return json if view_raw else json['value']
+
+    def history(self):
+        return expand(self._read(self._history)['History'])
+
+    def children(self):
+        return expand(self._read(self._children)['children'])
+
+    def _post(self, payload):
+        self.settings._ensure_logged_in()
+        self.settings._post_value(
+            self.env, self.path, self.override, payload, self.url,
+            self._set_params
+        )
+
+    def set(self, value):
+        self._post({'value': value})
+
+    def set_protect(self, protect):
+        self._post({'protect': protect})
@@ -0,0 +1,49 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Decoding of the json replies of the server.  Faster json libraries can be
+used instead of requests' own decoding, when one is installed.
+"""
+
+FAST_BACKENDS = ('ujson', 'simplejson')
+
+
+def find_fast_loads(backends=FAST_BACKENDS):
+    """
+    :return: the loads() of the first of 'backends' that can be imported,
+        or None if none of them can
+    """
+    for name in backends:
+        try:
+            module = __import__(name)
+        except ImportError:
+            continue
+        return module.loads
+    return None
+
+
+FAST_LOADS = find_fast_loads()
+
+
+def load_reply(resp, loads=None):
+    """
+    Decode the body of a response.
+
+    :param loads: a function decoding the raw body.  If None, the
+        response's own json() is used.
+    """
+    if loads is None:
+        return resp.json()
+    return loads(resp.content)
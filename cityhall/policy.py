@@ -0,0 +1,114 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import requests
+from errors import ServerError
+
+
+# Failures which mean the server is unavailable, rather than that it refused
+# a call.  Only these trip the circuit breaker, or have stale values served.
+UNAVAILABLE = (requests.RequestException, ServerError)
+
+
+class CircuitBreaker(object):
+    """
+    Stops calls to a failing server.  After 'failure_threshold' failures in
+    a row the circuit opens, and calls are refused for 'reset_timeout'
+    seconds.  Then a single trial call is let through: if it succeeds the
+    circuit closes again, otherwise it stays open for another
+    'reset_timeout' seconds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: True if a call may be made now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and \
+                    time.time() >= self._opened_at + self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.time()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class ReadPolicy(object):
+    """
+    How Settings reads values once they expire from its cache, or when the
+    server is unavailable.
+    """
+
+    def __init__(self, stale_while_revalidate=True, stale_if_error=True,
+                 breaker=None):
+        """
+        :param stale_while_revalidate: if True, an expired value is returned
+            at once, and fetched again in the background
+        :param stale_if_error: if True, an expired value is returned when the
+            server is unavailable, or the circuit is open
+        :param breaker: optional CircuitBreaker. Defaults to one with the
+            default thresholds.
+        """
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.breaker = breaker or CircuitBreaker()
+        self.last_error = None
+
+    def call(self, func):
+        """
+        Calls func() through the circuit breaker, recording whether the
+        server was available.  Calls refused by the server still count as
+        successes: it answered.
+        """
+        try:
+            result = func()
+        except UNAVAILABLE as ex:
+            self.last_error = ex
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
@@ -0,0 +1,132 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact records for the rows of 'viewchildren' and 'viewhistory' replies.
+
+Large cached trees hold many rows with the same keys and, across
+environments and overrides, the same paths and names.  Records keep their
+fields in slots instead of a per-row dict, and share a single copy of each
+path, name, override and author string.
+"""
+
+from datetime import datetime
+
+# Strings shared between records.  Once the table holds this many, it is
+# emptied and sharing starts over, so that strings which are no longer in
+# any cached record don't stay around forever.
+MAX_SHARED_STRINGS = 65536
+
+_strings = {}
+_DATETIME_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+
+def _share(value):
+    """
+    Return the one shared copy of an identifier string.  intern() can't be
+    used, as json returns unicode strings on Python 2.
+    """
+    if value is None:
+        return None
+    if len(_strings) >= MAX_SHARED_STRINGS:
+        _strings.clear()
+    return _strings.setdefault(value, value)
+
+
+class _Record(object):
+    __slots__ = ()
+    _shared = ()
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            value = row.get(field)
+            if field in self._shared:
+                value = _share(value)
+            setattr(self, field, value)
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        if field not in self.__slots__:
+            return default
+        return getattr(self, field)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.as_dict())
+
+
+class ChildRecord(_Record):
+    """
+    One row of a 'viewchildren' reply
+    """
+    __slots__ = ('override', 'path', 'id', 'value', 'protect', 'name')
+    _shared = ('override', 'path', 'name')
+
+
+class HistoryRecord(_Record):
+    """
+    One entry of a 'viewhistory' reply
+    """
+    __slots__ = (
+        'id', 'override', 'value', 'protect', 'active', 'datetime', 'name',
+        'author',
+    )
+    _shared = ('override', 'name', 'author')
+
+
+def parse_datetime(value):
+    """
+    Parse the 'datetime' of a history entry, which the server sends in ISO
+    8601 format, without a timezone.
+    """
+    if isinstance(value, datetime):
+        return value
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Not a datetime: {!r}".format(value))
+
+
+_COMPACT = {'children': ChildRecord, 'History': HistoryRecord}
+
+
+def compact(json):
+    """
+    Return a copy of a reply with its 'children' or 'History' rows turned
+    into records.  Other replies are returned as they are.
+    """
+    for field, record in _COMPACT.items():
+        rows = json.get(field)
+        if rows is not None:
+            json = dict(json)
+            json[field] = tuple(record(row) for row in rows)
+    return json
+
+
+def expand(rows):
+    """
+    Turn records back into the dicts the server returned.  Rows which were
+    never compacted are returned as they are.
+    """
+    return [
+        row.as_dict() if isinstance(row, _Record) else row for row in rows
+    ]
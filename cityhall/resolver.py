@@ -0,0 +1,42 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cache import _normalize_path
+
+
+class OverrideIndex(object):
+    """
+    Every override of every child of one path, as returned by a single
+    'viewchildren' call, indexed so that any override can be resolved
+    locally.
+    """
+
+    def __init__(self, children):
+        self._rows = {}
+        for row in children:
+            self._rows.setdefault(row['path'], {})[row['override']] = row
+
+    def __contains__(self, path):
+        return _normalize_path(path) in self._rows
+
+    def lookup(self, path, override):
+        """
+        :return: the row for 'override' at 'path', or the default row if
+            there is no such override.  None if neither exists.
+        """
+        rows = self._rows.get(_normalize_path(path))
+        if rows is None:
+            return None
+        row = rows.get(override)
+        return row if row is not None else rows.get('')
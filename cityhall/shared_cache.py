@@ -0,0 +1,240 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import fcntl
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from six.moves import cPickle as pickle
+from cache import CacheBackend, _normalize_path, _parent_path
+from errors import InvalidCall
+
+
+# Number of byte ranges of the lock file keys are spread over
+_LOCK_SLOTS = 4096
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' key TEXT PRIMARY KEY, env TEXT, path TEXT, value BLOB,'
+    ' expires REAL, etag TEXT)',
+    'CREATE INDEX IF NOT EXISTS entries_path ON entries (env, path)',
+    'CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)',
+)
+
+
+def _open_private(filename):
+    """
+    Opens a file only its owner may read and write, creating it if needed.
+    The cache holds protected values, and unpickling runs code, so files
+    other users could read or write are refused.
+
+    :return: the file descriptor
+    """
+    fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o600)
+    info = os.fstat(fd)
+    if info.st_uid != os.getuid() or \
+            stat.S_IMODE(info.st_mode) & (stat.S_IRWXG | stat.S_IRWXO):
+        os.close(fd)
+        raise InvalidCall(
+            "{} must be owned by this user, and only accessible to them"
+            .format(filename)
+        )
+    return fd
+
+
+class _RangeLock(object):
+    """
+    An exclusive lock on one byte of a file, held across processes.  Locks
+    on a file belong to the whole process, so threads of the same process
+    are kept out by 'thread_lock', taken first.
+    """
+
+    def __init__(self, fd, offset, thread_lock):
+        self.fd = fd
+        self.offset = offset
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+        except Exception:
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+        finally:
+            self.thread_lock.release()
+
+
+class SharedCache(CacheBackend):
+    """
+    A cache kept in an sqlite database, so that every process on a host
+    using the same file shares one copy of the values.  While one process
+    fetches a missing value, the others wait for it on a lock file next to
+    the database, then read what it stored, instead of asking the server
+    themselves.
+
+    Values are pickled, and unpickled on every read.  Both files are created
+    so that only their owner can access them, and existing files that other
+    users could access are refused.  Once more than
+    'max_size' entries are held, those which expire first are evicted, so
+    that reads never have to write.  As with ValueCache, every process
+    sharing a file should be logged in as the same user.
+    """
+
+    def __init__(self, filename, ttl=60, max_size=65536, keep_expired=False):
+        """
+        :param filename: the sqlite database, created if needed.  The lock
+            file is 'filename' + '.lock'
+        :param ttl: seconds an entry is considered valid for
+        :param max_size: maximum number of entries held
+        :param keep_expired: if True, keep entries without an ETag once they
+            expire as well
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.max_size = max_size
+        self.keep_expired = keep_expired
+        # sqlite gives its journal files the same permissions
+        os.close(_open_private(filename))
+        self._lock_fd = None
+        self.after_fork()
+        self._execute(*_SCHEMA)
+
+    def after_fork(self):
+        """
+        Opens new connections in a forked child: neither sqlite connections
+        nor the locks held on the lock file are shared with the parent, and
+        the locks of its threads could be held by threads which don't exist
+        there.
+        """
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._slot_locks = {}
+        self._slot_locks_lock = threading.Lock()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+        self._lock_fd = _open_private(self.filename + '.lock')
+
+    @property
+    def _db(self):
+        if self._pid != os.getpid():
+            self.after_fork()
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self.filename, timeout=30, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def _execute(self, *statements):
+        db = self._db
+        for statement in statements:
+            if isinstance(statement, tuple):
+                db.execute(*statement)
+            else:
+                db.execute(statement)
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key)
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _entry(self, key):
+        row = self._db.execute(
+            'SELECT value, expires, etag FROM entries WHERE key = ?',
+            (self._key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(bytes(row[0])), row[1], row[2]
+
+    def get(self, key):
+        entry = self._entry(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def get_expired(self, key):
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        value, _, etag = entry
+        if etag is None and not self.keep_expired:
+            return None
+        return value, etag
+
+    def set(self, key, value, etag=None):
+        data = sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        row_key = self._key(key)
+        expires = time.time() + self.ttl
+        updated = self._db.execute(
+            'UPDATE entries SET value = ?, expires = ?, etag = ?'
+            ' WHERE key = ?',
+            (data, expires, etag, row_key)
+        ).rowcount
+        if updated:
+            return
+
+        # Only a new entry can take the cache over max_size
+        self._execute(
+            ('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+             (row_key, key[0], key[1], data, expires, etag)),
+            ('DELETE FROM entries WHERE key IN ('
+             ' SELECT key FROM entries ORDER BY expires LIMIT MAX(0,'
+             '  (SELECT COUNT(*) FROM entries) - ?))',
+             (self.max_size,)),
+        )
+
+    def refresh(self, key):
+        self._execute((
+            'UPDATE entries SET expires = ? WHERE key = ?',
+            (time.time() + self.ttl, self._key(key))
+        ))
+
+    def invalidate(self, env, path):
+        path = _normalize_path(path)
+        self._execute((
+            'DELETE FROM entries WHERE env = ? AND path IN (?, ?)',
+            (env, path, _parent_path(path))
+        ))
+
+    def invalidate_env(self, env):
+        self._execute(('DELETE FROM entries WHERE env = ?', (env,)))
+
+    def lock(self, key):
+        offset = zlib.crc32(self._key(key).encode('utf-8')) % _LOCK_SLOTS
+        if self._pid != os.getpid():
+            self.after_fork()
+        with self._slot_locks_lock:
+            thread_lock = self._slot_locks.get(offset)
+            if thread_lock is None:
+                thread_lock = self._slot_locks[offset] = threading.Lock()
+        return _RangeLock(self._lock_fd, offset, thread_lock)
+
+    def clear(self):
+        self._execute('DELETE FROM entries')
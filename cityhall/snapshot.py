@@ -0,0 +1,103 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import mmap
+import os
+import threading
+from cache import _normalize_path
+
+
+def write_snapshot(filename, env, path, override, values):
+    """
+    Write values to a snapshot file.  The file is replaced atomically, so
+    processes that have the old one open are not affected.
+
+    The first line is a json header describing what the snapshot holds.
+    Every following line is a json [path, value] pair, sorted by path, so
+    that lookups can binary search the file without parsing all of it.
+
+    :param values: dict of path to value, as returned by get_tree(flat=True)
+    """
+    header = {'env': env, 'path': _normalize_path(path), 'override': override}
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        for key in sorted(values):
+            line = json.dumps([key, values[key]])
+            f.write(line.encode('utf-8') + b'\n')
+    os.rename(tmp, filename)
+
+
+class Snapshot(object):
+    """
+    A read-only, memory-mapped view of a file written by write_snapshot()
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = self._map.find(b'\n')
+        header = json.loads(self._map[:end].decode('utf-8'))
+        self._body = end + 1
+        self.env = header['env']
+        self.path = header['path']
+        self.override = header['override']
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        """
+        Unmaps the file.  Lookups made afterwards find nothing.
+        """
+        with self._lock:
+            if not self.closed:
+                self._map.close()
+                self.closed = True
+
+    def covers(self, env, path, override):
+        """
+        Whether a get() for these arguments can be answered by this snapshot
+        """
+        return (
+            env == self.env and
+            override == self.override and
+            _normalize_path(path).startswith(self.path)
+        )
+
+    def lookup(self, path):
+        """
+        :return: (found, value) for the given path
+        """
+        path = _normalize_path(path)
+        with self._lock:
+            if self.closed:
+                return False, None
+            return self._search(path)
+
+    def _search(self, path):
+        lo, hi = self._body, len(self._map)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = max(self._map.rfind(b'\n', 0, mid) + 1, lo)
+            end = self._map.find(b'\n', mid)
+            key, value = json.loads(self._map[start:end].decode('utf-8'))
+            if key == path:
+                return True, value
+            if path < key:
+                hi = start
+            else:
+                lo = end + 1
+        return False, None
@@ -0,0 +1,141 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import threading
+
+
+# Upper bounds, in seconds, of the latency histogram buckets.  Calls slower
+# than the last bound are counted in one more, final, bucket.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+
+class EndpointStats(object):
+    """
+    Statistics for the calls made to one endpoint
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.bytes_sent = 0
+        self.latencies = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.errors = {}
+
+    def record(self, seconds, size, error, sent=0):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += size
+        self.bytes_sent += sent
+        self.latencies[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        if error is not None:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'bytes': self.bytes,
+            'bytes_sent': self.bytes_sent,
+            'latencies': list(self.latencies),
+            'errors': dict(self.errors),
+        }
+
+
+class Stats(object):
+    """
+    In-memory statistics about the calls made by a Settings: per endpoint
+    call counts, latency histograms, bytes received and sent, and errors by
+    type, as well as cache hits and misses, how many revalidations of expired
+    cache entries found them unchanged, and how many expired values were
+    served.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def after_fork(self):
+        """
+        Starts over in a forked child, so the numbers of each process are
+        its own.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.revalidations = 0
+            self.not_modified = 0
+            self.stale_served = 0
+
+    def record_call(self, endpoint, seconds, size, error, sent=0):
+        """
+        :param size: the length of the response in bytes
+        :param sent: the length of the request body in bytes
+        """
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.record(seconds, size, error, sent)
+
+    def record_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_revalidation(self, modified):
+        with self._lock:
+            self.revalidations += 1
+            if not modified:
+                self.not_modified += 1
+
+    def record_stale(self):
+        with self._lock:
+            self.stale_served += 1
+
+    @property
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return float(self.cache_hits) / lookups if lookups else 0.0
+
+    def as_dict(self):
+        """
+        :return: a copy of the current numbers, as plain dicts and lists
+        """
+        with self._lock:
+            return {
+                'endpoints': {
+                    name: stats.as_dict()
+                    for name, stats in self.endpoints.items()
+                },
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'revalidations': self.revalidations,
+                'not_modified': self.not_modified,
+                'stale_served': self.stale_served,
+            }
@@ -0,0 +1,100 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+
+class _TimeoutAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter which applies a default timeout to every request that
+    doesn't specify one.
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['timeout']
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super(_TimeoutAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(_TimeoutAdapter, self).send(request, **kwargs)
+
+
+class Transport(object):
+    """
+    Describes how Settings talks to the City Hall server: connection
+    pooling, keep-alive, timeouts and retries.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, timeout=(5, 30), retries=0,
+                 backoff_factor=0.5, retry_statuses=(502, 503, 504)):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: maximum connections kept open to one host.
+            This should be at least the number of threads sharing a Settings.
+        :param pool_block: if True, wait for a free connection when all of
+            them are in use, instead of opening one which is then discarded
+        :param keep_alive: if False, connections are closed after each call
+        :param timeout: seconds to wait for the server, either a number or a
+            (connect, read) tuple.  None waits forever.
+        :param retries: number of times to retry a failed call.  Only calls
+            which are safe to repeat are retried, so POSTs never are.
+        :param backoff_factor: retries sleep for backoff_factor * 2^n seconds
+        :param retry_statuses: status codes from the server worth retrying
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+
+    def build_adapter(self):
+        # Without retries, error statuses must reach Settings as they are,
+        # rather than as a RetryError
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.retry_statuses if self.retries else None,
+        )
+        return _TimeoutAdapter(
+            timeout=self.timeout,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=retry,
+        )
+
+    def build_session(self, adapter=None, cookies=None):
+        """
+        :param adapter: the adapter to use, so that several sessions can
+            share one connection pool.  A new one is built by default.
+        :param cookies: the cookie jar to use, so that several sessions can
+            share one login.
+        """
+        session = requests.Session()
+        if cookies is not None:
+            session.cookies = cookies
+        adapter = adapter or self.build_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
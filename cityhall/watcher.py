@@ -0,0 +1,169 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from cache import _normalize_path
+from errors import NoDefaultEnv
+from workers import DEFAULT_WORKERS
+
+
+class Watcher(object):
+    """
+    Keeps local copies of watched paths, or whole subtrees, up to date.
+
+    Watched values are read from memory by get().  A background thread,
+    started with start(), fetches them again every 'interval' seconds and
+    calls the registered callbacks for every value that changed, so changes
+    made on the server are seen within 'interval' seconds.  Refreshes always
+    call the server: the Settings' cache, snapshot and read_policy are not
+    consulted, though the cache is updated with what was fetched.
+
+    Each watch keeps its own values, so watches that overlap, such as a
+    subtree and a path under it, each see every change made to them.
+    """
+
+    def __init__(self, settings, interval=30):
+        """
+        :param settings: the Settings used to talk to the server
+        :param interval: seconds between refreshes
+        """
+        self.settings = settings
+        self.interval = interval
+        self.last_error = None
+        # (env, path, override) -> (subtree, callbacks, {path: value})
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _resolve_env(self, env):
+        env = env or self.settings.default_env
+        if env is None:
+            raise NoDefaultEnv()
+        return env
+
+    def watch(self, path, env=None, override=None, subtree=False,
+              callback=None):
+        """
+        Starts watching a path.  Its current value is fetched before this
+        returns.
+
+        :param subtree: if True, watch every value under 'path' instead
+        :param callback: called as callback(path, old, new) whenever a
+            value changes.  For subtrees, values that appear or disappear
+            are reported with None as their old or new value.
+        """
+        env = self._resolve_env(env)
+        key = (env, _normalize_path(path), override)
+        with self._lock:
+            callbacks = self._watches.setdefault(key, (subtree, [], {}))[1]
+            if callback is not None:
+                callbacks.append(callback)
+        self._refresh(key, subtree, [])
+
+    def unwatch(self, path, env=None, override=None):
+        env = self._resolve_env(env)
+        key = (env, _normalize_path(path), override)
+        with self._lock:
+            self._watches.pop(key, None)
+
+    def get(self, path, env=None, override=None):
+        """
+        Returns the value of a watched path from memory.  Paths which are
+        not watched are retrieved with Settings.get()
+        """
+        env = self._resolve_env(env)
+        path = _normalize_path(path)
+        with self._lock:
+            for (watch_env, _, watch_override), (_, _, values) in \
+                    self._watches.items():
+                if (watch_env == env and watch_override == override and
+                        path in values):
+                    return values[path]
+        return self.settings.get(path, env=env, override=override)
+
+    def refresh(self):
+        """
+        Fetches every watched path once, and calls the callbacks for the
+        values that changed.  If fetching a path fails, its last known
+        values are kept, and the error is stored in 'last_error'.
+        """
+        with self._lock:
+            watches = [
+                (key, subtree, list(callbacks))
+                for key, (subtree, callbacks, _) in self._watches.items()
+            ]
+        for key, subtree, callbacks in watches:
+            try:
+                self._refresh(key, subtree, callbacks)
+            except Exception as ex:
+                self.last_error = ex
+
+    def _refresh(self, key, subtree, callbacks):
+        env, path, override = key
+        if subtree:
+            fetched = self.settings._tree(
+                path, env, override, True, DEFAULT_WORKERS, fresh=True
+            )
+        else:
+            params = None if override is None else {'override': override}
+            json = self.settings._get_raw(env, path, params, fresh=True)
+            fetched = {path: json['value']}
+
+        changes = []
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                return
+            values = watch[2]
+            for value_path in list(values):
+                if value_path not in fetched:
+                    changes.append((value_path, values.pop(value_path), None))
+            for value_path, value in fetched.items():
+                old = values.get(value_path)
+                if value_path not in values or old != value:
+                    changes.append((value_path, old, value))
+                values[value_path] = value
+
+        for changed_path, old, new in changes:
+            for callback in callbacks:
+                try:
+                    callback(changed_path, old, new)
+                except Exception as ex:
+                    self.last_error = ex
+
+    def start(self):
+        """
+        Starts the background thread refreshing watched paths
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread, and waits for it to finish
+        """
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.refresh()
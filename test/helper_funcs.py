@@ -13,6 +13,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from mock import MagicMock, patch
+from json import dumps
 from cityhall.errors import NotLoggedIn, FailedCall
 
 
@@ -29,15 +30,31 @@ def build(reply='Ok', message=None, status_code=200, update=None):
     """
     ret = MagicMock()
     ret.status_code = status_code
+    ret.headers = {}
     json = {'Response': reply}
     if message:
         json['Message'] = message
     if update:
         json.update(update)
     ret.json.return_value = json
+    ret.content = dumps(json, default=str).encode('utf-8')
     return ret
 
 
+def child(path, value, override=''):
+    """
+    Builds one row of a 'viewchildren' reply
+    """
+    return {
+        'override': override,
+        'path': path,
+        'id': 1,
+        'value': value,
+        'protect': False,
+        'name': path.rstrip('/').split('/')[-1],
+    }
+
+
 class TestRaisesLoggedOutMixin(object):
     """
     Tets that if the user is logged out, a NotLoggedIn error is raised
@@ -0,0 +1,58 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall.asynchronous import AsyncSettings, gather
+from cityhall.errors import FailedCall, InvalidCall
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+class TestAsyncSettings(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = AsyncSettings(self.url, 'test_user', '')
+
+    def tearDown(self):
+        self.settings.close()
+
+    def test_logs_in_and_gets_default_env(self):
+        self.assertEqual('dev', self.settings.default_env)
+
+    @patch('requests.Session.get')
+    def test_gather_gets(self, get):
+        get.side_effect = lambda url, params=None: build(
+            update={'value': url[len(self.url):]}
+        )
+        values = gather(
+            self.settings.get('/a'),
+            self.settings.get('/b', env='qa'),
+            self.settings.get('/c', override='guest'),
+        )
+        self.assertEqual(['env/dev/a/', 'env/qa/b/', 'env/dev/c/'], values)
+
+    @patch('requests.Session.post')
+    def test_failures_are_raised_on_result(self, post):
+        post.return_value = build(reply='Failure', message='Some message')
+        result = self.settings.set('dev', '/abc', '', 'value')
+        with self.assertRaises(FailedCall):
+            result.get()
+
+    def test_invalid_path_is_raised_immediately(self):
+        with self.assertRaises(InvalidCall):
+            self.settings.get('abc')
@@ -18,7 +18,7 @@ from cityhall import (
     _hash_password,
     _ensure_okay
 )
-from cityhall.errors import FailedCall, InvalidCall
+from cityhall.errors import FailedCall, InvalidCall, SessionExpired
 from unittest import TestCase
 from helper_funcs import (
     build,
@@ -26,6 +26,7 @@ from helper_funcs import (
     TestFailureIsReturnedMixin,
 )
 from mock import patch
+import threading
 
 
 class TestSettingsFuncs(TestCase):
@@ -331,3 +332,131 @@ class TestAuthGrant(
         call = lambda: self.settings.grant_rights('dev', 'abc', 2)
         self.failed_call_honored(call, 'requests.Session.post')
         self.logout_honored(call, self.settings)
+
+
+class TestLazyLogin(TestCase, TestRaisesLoggedOutMixin):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.name = 'test_user'
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.post')
+    def test_nothing_is_sent_until_needed(self, post, get):
+        settings = Settings(self.url, self.name, 'abc', lazy=True)
+        self.assertEqual(0, post.call_count)
+        self.assertEqual(0, get.call_count)
+        self.assertFalse(settings.logged_in)
+
+        post.return_value = build()
+        get.return_value = build(update={'value': '1'})
+        self.assertEqual('1', settings.get('/abc', env='qa'))
+        post.assert_called_once_with(
+            self.url + 'auth/',
+            data={'username': self.name, 'passhash': _hash_password('abc')}
+        )
+        get.assert_called_once_with(self.url + 'env/qa/abc/', params=None)
+        self.assertTrue(settings.logged_in)
+
+        get.return_value = build(update={'value': 'dev'})
+        self.assertEqual('dev', settings.default_env)
+        get.assert_called_with(
+            self.url + 'auth/user/' + self.name + '/default/'
+        )
+        settings.default_env
+        self.assertEqual(2, get.call_count)
+        self.assertEqual(1, post.call_count)
+
+    @patch('requests.Session.get')
+    @patch('requests.Session.post')
+    def test_prefetch(self, post, get):
+        post.return_value = build()
+        get.return_value = build(update={'value': 'dev'})
+        settings = Settings(self.url, self.name, '', lazy=True)
+        settings.prefetch().join()
+        self.assertTrue(settings.logged_in)
+        self.assertEqual(1, get.call_count)
+        self.assertEqual('dev', settings.default_env)
+        self.assertEqual(1, get.call_count)
+
+    @patch('requests.Session.post')
+    def test_failed_login_is_raised_on_use(self, post):
+        post.return_value = build(reply='Failure', message='Bad password')
+        settings = Settings(self.url, self.name, '', lazy=True)
+        settings.prefetch().join()
+        with self.assertRaises(FailedCall):
+            settings.get('/abc', env='dev')
+
+    def test_log_out_before_login(self):
+        settings = Settings(self.url, self.name, '', lazy=True)
+        self.logout_honored(lambda: settings.get('/abc', env='dev'), settings)
+
+
+class TestRelogin(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.name = 'test_user'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, self.name, 'abc')
+
+    def test_ensure_okay_detects_expired_sessions(self):
+        with self.assertRaises(SessionExpired):
+            _ensure_okay(build(status_code=401))
+        with self.assertRaises(SessionExpired):
+            _ensure_okay(build(reply='Failure', message='Not logged in'))
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_expired_session_is_replayed(self, get, post):
+        get.side_effect = [
+            build(reply='Failure', message='Not logged in'),
+            build(update={'value': '1'}),
+        ]
+        post.return_value = build()
+        self.assertEqual('1', self.settings.get('/abc'))
+        post.assert_called_once_with(
+            self.url + 'auth/',
+            data={'username': self.name, 'passhash': _hash_password('abc')}
+        )
+        self.assertEqual(2, get.call_count)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_concurrent_expiry_logs_in_once(self, get, post):
+        # Distinct paths, as identical reads would share a single call
+        paths = ['/abc{}'.format(i) for i in range(8)]
+        expired = threading.Event()
+        expired_urls = []
+        post.return_value = build()
+
+        def reply(url, params=None):
+            if post.call_count == 0:
+                expired_urls.append(url)
+                if len(expired_urls) == len(paths):
+                    expired.set()
+                expired.wait(1)
+                return build(reply='Failure', message='Not logged in')
+            return build(update={'value': '1'})
+        get.side_effect = reply
+
+        threads = [
+            threading.Thread(target=self.settings.get, args=(path,))
+            for path in paths
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(paths), len(set(expired_urls)))
+        self.assertEqual(1, post.call_count)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_failed_relogin_is_raised(self, get, post):
+        get.return_value = build(reply='Failure', message='Not logged in')
+        post.return_value = build(reply='Failure', message='Bad password')
+        with self.assertRaises(FailedCall):
+            self.settings.get('/abc')
+        self.assertEqual(1, post.call_count)
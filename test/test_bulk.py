@@ -0,0 +1,203 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings
+from cityhall.errors import FailedCall, InvalidCall
+from cityhall.workers import fan_out
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class FakeTree(object):
+    """
+    Replies to viewchildren calls from a dict of path to children rows
+    """
+    def __init__(self, url, children):
+        self.url = url
+        self.children = children
+        self.requested = []
+
+    def __call__(self, url, params=None):
+        path = url[len(self.url) + len('env/dev'):]
+        self.requested.append(path)
+        if path not in self.children:
+            return build(reply='Failure', message='no such path')
+        return build(update={'children': self.children[path]})
+
+
+class TestFanOut(TestCase):
+    def test_results_are_in_order(self):
+        results = fan_out(lambda x: x * 2, range(20), max_workers=4)
+        self.assertEqual([(x * 2, None) for x in range(20)], results)
+
+    def test_errors_are_reported_per_item(self):
+        def func(x):
+            if x == 1:
+                raise FailedCall('one')
+            return x
+        results = fan_out(func, [0, 1, 2])
+        self.assertEqual((0, None), results[0])
+        self.assertIsInstance(results[1][1], FailedCall)
+        self.assertEqual((2, None), results[2])
+
+
+class TestGetTree(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.name = 'test_user'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, self.name, '')
+        self.tree = FakeTree(self.url, {
+            '/app/': [
+                child('/app/a/', '1'),
+                child('/app/a/', '2', override=self.name),
+                child('/app/b/', '3'),
+                child('/app/b/', '4', override='guest'),
+            ],
+            '/app/a/': [child('/app/a/x/', '5')],
+            '/app/b/': [],
+            '/app/a/x/': [],
+        })
+
+    @patch('requests.Session.get')
+    def test_get_tree_flat(self, get):
+        get.side_effect = self.tree
+        values = self.settings.get_tree('/app', flat=True)
+        self.assertEqual(
+            {'/app/a/': '2', '/app/b/': '3', '/app/a/x/': '5'}, values
+        )
+        self.assertEqual(4, get.call_count)
+        self.assertEqual('/app/', self.tree.requested[0])
+        self.assertEqual('/app/a/x/', self.tree.requested[-1])
+
+    @patch('requests.Session.get')
+    def test_get_tree_nested_with_override(self, get):
+        get.side_effect = self.tree
+        tree = self.settings.get_tree('/app', override='guest')
+        self.assertEqual('1', tree['a']['value'])
+        self.assertEqual('4', tree['b']['value'])
+        self.assertEqual('5', tree['a']['children']['x']['value'])
+        self.assertEqual({}, tree['b']['children'])
+
+    @patch('requests.Session.get')
+    def test_get_tree_other_override_listed_first(self, get):
+        get.side_effect = FakeTree(self.url, {
+            '/app/': [
+                child('/app/a/', '2', override='guest'),
+                child('/app/a/', '1'),
+                child('/app/b/', '3', override='guest'),
+            ],
+            '/app/a/': [],
+            '/app/b/': [],
+        })
+        values = self.settings.get_tree('/app', flat=True)
+        self.assertEqual({'/app/a/': '1', '/app/b/': None}, values)
+
+    @patch('requests.Session.get')
+    def test_get_tree_raises_failures(self, get):
+        del self.tree.children['/app/a/x/']
+        get.side_effect = self.tree
+        with self.assertRaises(FailedCall):
+            self.settings.get_tree('/app')
+
+
+class TestGetMany(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+
+    @patch('requests.Session.get')
+    def test_get_many(self, get):
+        def reply(url, params=None):
+            if url.endswith('/missing/'):
+                return build(reply='Failure', message='no such path')
+            return build(update={'value': url[len(self.url):]})
+        get.side_effect = reply
+
+        values = self.settings.get_many(
+            ['/a', '/b', '/missing', 'invalid'], env='qa'
+        )
+        self.assertEqual('env/qa/a/', values['/a'])
+        self.assertEqual('env/qa/b/', values['/b'])
+        self.assertIsInstance(values['/missing'], FailedCall)
+        self.assertIsInstance(values['invalid'], InvalidCall)
+        self.assertEqual(3, get.call_count)
+
+    @patch('requests.Session.get')
+    def test_get_many_with_override(self, get):
+        get.return_value = build(update={'value': '1'})
+        self.settings.get_many(['/a'], override='guest')
+        get.assert_called_once_with(
+            self.url + 'env/dev/a/', params={'override': 'guest'}
+        )
+
+
+class TestSetMany(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+
+    @patch('requests.Session.post')
+    def test_set_many(self, post):
+        def reply(url, data=None, params=None):
+            if url.endswith('/denied/'):
+                return build(reply='Failure', message='No rights')
+            return build()
+        post.side_effect = reply
+
+        report = self.settings.set_many('dev', [
+            ('/a', '', '1'),
+            ('/denied', '', '2'),
+            ('/b', 'guest', '3'),
+        ])
+        self.assertEqual(('/a', '', None), report[0])
+        self.assertEqual(('/denied', ''), report[1][:2])
+        self.assertIsInstance(report[1][2], FailedCall)
+        self.assertEqual(('/b', 'guest', None), report[2])
+        post.assert_any_call(
+            self.url + 'env/dev/b/',
+            data={'value': '3'},
+            params={'override': 'guest'}
+        )
+        self.assertEqual(3, post.call_count)
+
+    @patch('requests.Session.post')
+    def test_set_many_protect(self, post):
+        post.return_value = build()
+        self.settings.set_many('dev', [('/a', '', True)], protect=True)
+        post.assert_called_once_with(
+            self.url + 'env/dev/a/',
+            data={'protect': True},
+            params={'override': ''}
+        )
+
+    @patch('requests.Session.post')
+    def test_set_many_validates_first(self, post):
+        with self.assertRaises(InvalidCall):
+            self.settings.set_many('dev', [('/a', '', '1'), ('b', '', '2')])
+        with self.assertRaises(InvalidCall):
+            self.settings.set_many(1, [('/a', '', '1')])
+        self.assertEqual(0, post.call_count)
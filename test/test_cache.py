@@ -0,0 +1,97 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall.cache import cache_key
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+class TestValueCache(TestCase):
+    def test_values_expire(self):
+        cache = ValueCache(ttl=10)
+        key = cache_key('dev', '/abc', None)
+        with patch('cityhall.cache.time.time') as now:
+            now.return_value = 100
+            cache.set(key, 'value')
+            now.return_value = 109
+            self.assertEqual('value', cache.get(key))
+            now.return_value = 110
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(0, len(cache))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ValueCache(max_size=2)
+        cache.set(cache_key('dev', '/a', None), 'a')
+        cache.set(cache_key('dev', '/b', None), 'b')
+        cache.get(cache_key('dev', '/a', None))
+        cache.set(cache_key('dev', '/c', None), 'c')
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(cache_key('dev', '/b', None)))
+        self.assertEqual('a', cache.get(cache_key('dev', '/a', None)))
+        self.assertEqual('c', cache.get(cache_key('dev', '/c', None)))
+
+    def test_invalidate_drops_path_and_parent_listing(self):
+        cache = ValueCache()
+        value = cache_key('dev', '/abc/val1', None)
+        override = cache_key('dev', '/abc/val1/', {'override': 'guest'})
+        children = cache_key('dev', '/abc/', {'viewchildren': True})
+        other_env = cache_key('qa', '/abc/val1', None)
+        for key in (value, override, children, other_env):
+            cache.set(key, 'x')
+
+        cache.invalidate('dev', '/abc/val1')
+        self.assertIsNone(cache.get(value))
+        self.assertIsNone(cache.get(override))
+        self.assertIsNone(cache.get(children))
+        self.assertEqual('x', cache.get(other_env))
+
+
+class TestSettingsCache(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache()
+                )
+
+    @patch('requests.Session.get')
+    def test_get_is_served_from_cache(self, get):
+        get.return_value = build(update={'value': '1000', 'History': []})
+        self.assertEqual('1000', self.settings.get('/abc'))
+        self.assertEqual('1000', self.settings.get('/abc/'))
+        self.assertEqual(1, get.call_count)
+
+        self.settings.get('/abc', override='guest')
+        self.settings.get_history('/abc')
+        self.assertEqual(3, get.call_count)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_set_invalidates(self, get, post):
+        get.return_value = build(update={'value': '1000'})
+        post.return_value = build()
+        self.settings.get('/abc')
+        self.settings.set('dev', '/abc', '', '50')
+        self.settings.get('/abc')
+        self.assertEqual(2, get.call_count)
+
+        self.settings.set_protect('dev', '/abc', '', True)
+        self.settings.get('/abc')
+        self.assertEqual(3, get.call_count)
@@ -0,0 +1,115 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, register_decoder
+from cityhall import decoders
+from cityhall.decoders import decode_bool, decode_duration
+from cityhall.errors import InvalidCall
+from unittest import TestCase
+from helper_funcs import build
+from mock import MagicMock, patch
+from datetime import timedelta
+
+
+class TestDecoders(TestCase):
+    def test_decode_bool(self):
+        for raw in ('true', 'True', ' yes', 'on', '1'):
+            self.assertIs(True, decode_bool(raw))
+        for raw in ('false', 'No', 'off', '0', ''):
+            self.assertIs(False, decode_bool(raw))
+        with self.assertRaises(ValueError):
+            decode_bool('maybe')
+
+    def test_decode_duration(self):
+        self.assertEqual(timedelta(milliseconds=250), decode_duration('250ms'))
+        self.assertEqual(timedelta(seconds=30), decode_duration('30'))
+        self.assertEqual(timedelta(minutes=1.5), decode_duration('1.5m'))
+        self.assertEqual(timedelta(hours=1), decode_duration('1h'))
+        self.assertEqual(timedelta(days=2), decode_duration('2 d'))
+        with self.assertRaises(ValueError):
+            decode_duration('soon')
+
+
+class TestTypedGets(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+
+    def tearDown(self):
+        for name in ('memo_test', 'csv'):
+            decoders._decoders.pop(name, None)
+
+    @patch('requests.Session.get')
+    def test_typed_gets(self, get):
+        get.return_value = build(update={'value': '42'})
+        self.assertEqual(42, self.settings.get_int('/abc'))
+        self.assertEqual(42.0, self.settings.get_float('/abc'))
+        get.return_value = build(update={'value': 'on'})
+        self.assertIs(True, self.settings.get_bool('/abc'))
+        get.return_value = build(update={'value': '5m'})
+        self.assertEqual(
+            timedelta(minutes=5), self.settings.get_duration('/abc')
+        )
+        get.return_value = build(update={'value': 'abc'})
+        with self.assertRaises(ValueError):
+            self.settings.get_int('/abc')
+        with self.assertRaises(InvalidCall):
+            self.settings.get_as('no such decoder', '/abc')
+
+    @patch('requests.Session.get')
+    def test_decoded_values_are_reused(self, get):
+        decode = MagicMock(side_effect=lambda raw: {'raw': raw})
+        register_decoder('memo_test', decode)
+        get.return_value = build(update={'value': '{"a": 1}'})
+        first = self.settings.get_as('memo_test', '/abc')
+        self.assertIs(first, self.settings.get_as(decode, '/abc/'))
+        self.assertIs(first, self.settings.get_as('memo_test', '/abc'))
+        self.assertEqual(1, decode.call_count)
+
+        self.settings.get_as(decode, '/abc', env='qa')
+        self.assertEqual(2, decode.call_count)
+
+        get.return_value = build(update={'value': '{"a": 2}'})
+        second = self.settings.get_as(decode, '/abc')
+        self.assertEqual({'raw': '{"a": 2}'}, second)
+        self.assertEqual(3, decode.call_count)
+        self.assertEqual({'a': 2}, self.settings.get_json('/abc'))
+
+    @patch('requests.Session.get')
+    def test_unregistered_functions_are_not_remembered(self, get):
+        get.return_value = build(update={'value': '7'})
+        for _ in range(3):
+            self.assertEqual(7, self.settings.get_as(lambda v: int(v), '/a'))
+        self.assertEqual(0, len(self.settings._decoded))
+        self.settings.get_int('/a')
+        self.assertEqual(1, len(self.settings._decoded))
+
+    @patch('requests.Session.get')
+    def test_registered_decoder(self, get):
+        register_decoder('csv', lambda raw: raw.split(','))
+        get.return_value = build(update={'value': 'a,b'})
+        self.assertEqual(['a', 'b'], self.settings.get_as('csv', '/abc'))
+        self.assertEqual('A,B', self.settings.get_as(str.upper, '/abc'))
+
+    @patch('requests.Session.get')
+    def test_registering_again_replaces_remembered_values(self, get):
+        get.return_value = build(update={'value': 'a,b'})
+        register_decoder('csv', lambda raw: raw.split(','))
+        self.assertEqual(['a', 'b'], self.settings.get_as('csv', '/abc'))
+        register_decoder('csv', lambda raw: raw.split(',')[::-1])
+        self.assertEqual(['b', 'a'], self.settings.get_as('csv', '/abc'))
@@ -0,0 +1,111 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache, Stats
+from cityhall.cache import cache_key
+from cityhall.errors import InvalidCall
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class TestEnvView(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.stats = Stats()
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache(),
+                    stats=self.stats,
+                )
+        self.qa = self.settings.env('qa')
+
+    @patch('requests.Session.get')
+    def test_reads(self, get):
+        url = self.url + 'env/qa/abc/'
+        get.return_value = build(update={'value': '1'})
+        get.return_value.content = b'{"Response": "Ok", "value": "1"}'
+        self.assertEqual('1', self.qa.get('/abc'))
+        self.assertEqual('1', self.qa.get('/abc'))
+        self.assertEqual('1', self.settings.get('/abc', env='qa'))
+        get.assert_called_once_with(url, params=None)
+
+        get.return_value = build(update={'History': [], 'children': []})
+        self.assertEqual([], self.qa.get_history('/abc', override='x'))
+        get.assert_called_with(
+            url, params={'override': 'x', 'viewhistory': True}
+        )
+        self.assertEqual([], self.qa.get_children('/abc'))
+        get.assert_called_with(url, params={'viewchildren': True})
+
+        self.assertEqual(1, self.qa.stats.cache_hits)
+        self.assertEqual(3, self.qa.stats.cache_misses)
+        self.assertEqual(2, self.stats.cache_hits)
+
+        # Only calls to the server are recorded, as with the Settings' Stats
+        view = self.qa.stats.endpoints
+        self.assertEqual(1, view['get'].calls)
+        self.assertEqual(1, view['history'].calls)
+        self.assertEqual(1, view['children'].calls)
+        self.assertEqual(32, view['get'].bytes)
+        self.assertEqual(
+            self.stats.endpoints['get'].as_dict()['bytes'],
+            view['get'].bytes
+        )
+
+    @patch('requests.Session.post')
+    def test_writes(self, post):
+        post.return_value = build()
+        self.qa.set('/abc', '', '1')
+        post.assert_called_once_with(
+            self.url + 'env/qa/abc/', data={'value': '1'},
+            params={'override': ''},
+        )
+        self.qa.set_protect('/abc', 'x', True)
+        post.assert_called_with(
+            self.url + 'env/qa/abc/', data={'protect': True},
+            params={'override': 'x'},
+        )
+        self.assertEqual(2, self.qa.stats.endpoints['set'].calls)
+        self.assertEqual(2, self.stats.endpoints['set'].calls)
+        with self.assertRaises(InvalidCall):
+            self.qa.set('abc', '', '1')
+
+    @patch('requests.Session.get')
+    def test_warm_and_invalidate(self, get):
+        def reply(url, params=None):
+            rows = [child('/app/a/', '1')] if url.endswith('/app/') else []
+            return build(update={'children': rows})
+        get.side_effect = reply
+        self.qa.warm('/app')
+        calls = get.call_count
+        self.assertEqual(calls, self.qa.stats.endpoints['children'].calls)
+        self.assertEqual('1', self.qa.get('/app/a'))
+        self.assertEqual(calls, get.call_count)
+
+        self.settings.cache.set(cache_key('dev', '/app/a', None), 'dev')
+        self.qa.invalidate()
+        cache = self.settings.cache
+        self.assertIsNone(cache.get(cache_key('qa', '/app/a', None)))
+        self.assertEqual('dev', cache.get(cache_key('dev', '/app/a', None)))
+
+    @patch('requests.Session.get')
+    def test_path(self, get):
+        get.return_value = build(update={'value': '1'})
+        handle = self.qa.path('/abc', override='x')
+        self.assertEqual('qa', handle.env)
+        self.assertEqual('1', handle.get())
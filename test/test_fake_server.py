@@ -0,0 +1,67 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings
+from cityhall.errors import SessionExpired
+from benchmarks.fake_server import FakeCityHall
+from benchmarks.run import main
+from unittest import TestCase
+from mock import patch
+
+
+class TestAgainstFakeServer(TestCase):
+    """
+    Runs the library over real HTTP, against the benchmarks' fake server
+    """
+    def setUp(self):
+        self.server = FakeCityHall().start()
+        self.server.put('dev', '/app', '')
+        self.server.put('dev', '/app/a', '1')
+        self.server.put('dev', '/app/a', '2', override='guest')
+        self.settings = Settings(self.server.url, 'cityhall', '')
+
+    def tearDown(self):
+        self.settings.log_out()
+        self.server.stop()
+
+    def test_round_trip(self):
+        self.assertEqual('dev', self.settings.default_env)
+        self.assertEqual('1', self.settings.get('/app/a'))
+        self.assertEqual('2', self.settings.get('/app/a', override='guest'))
+
+        self.settings.set('dev', '/app/a', '', '3')
+        self.assertEqual('3', self.settings.get('/app/a'))
+        self.assertEqual(
+            ['1', '3'],
+            [h['value'] for h in self.settings.get_history('/app/a')]
+        )
+        children = self.settings.get_children('/app')
+        self.assertEqual(2, len(children))
+        self.assertEqual({'a': {'value': '3', 'children': {}}},
+                         self.settings.get_tree('/app'))
+
+    def test_expired_session_logs_in_again(self):
+        self.server.expire_sessions()
+        self.assertEqual('1', self.settings.get('/app/a'))
+        self.assertEqual(1, len(self.server.sessions))
+
+    def test_expired_session_fails_without_relogin(self):
+        self.settings.relogin = False
+        self.server.expire_sessions()
+        with self.assertRaises(SessionExpired):
+            self.settings.get('/app/a')
+
+    def test_benchmark_runs(self):
+        with patch('sys.stdout'):
+            main(['--calls', '5', '--threads', '2', '--only', 'get'])
@@ -0,0 +1,72 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, Stats, ValueCache
+from cityhall.errors import InvalidCall
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+import os
+
+
+class TestFork(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.stats = Stats()
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache(),
+                    stats=self.stats
+                )
+        self.settings._cookies.set('sessionid', 'abc')
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_child_rebuilds_transport(self, get, post):
+        get.return_value = build(update={'value': '1'})
+        parent_session = self.settings.session
+        parent_adapter = parent_session.get_adapter(self.url)
+
+        with patch('cityhall.os.getpid', return_value=os.getpid() + 1):
+            session = self.settings.session
+            self.assertIsNot(parent_session, session)
+            self.assertIsNot(parent_adapter, session.get_adapter(self.url))
+            self.assertEqual('abc', session.cookies.get('sessionid'))
+            self.assertEqual({}, self.stats.as_dict()['endpoints'])
+
+            self.assertEqual('1', self.settings.get('/abc'))
+            self.assertIs(session, self.settings.session)
+        self.assertEqual(0, post.call_count)
+
+    @patch('requests.Session.get')
+    def test_preload(self, get):
+        get.side_effect = lambda url, params=None: build(update={
+            'children': [child('/app/a/', '1')] if url.endswith('/app/') else []
+        })
+        self.settings.preload('/app')
+        calls = get.call_count
+
+        with patch('cityhall.os.getpid', return_value=os.getpid() + 1):
+            self.assertEqual('1', self.settings.get('/app/a'))
+            raw = self.settings.get('/app/a', view_raw=True)
+            self.assertFalse(raw['protect'])
+        self.assertEqual(calls, get.call_count)
+
+    def test_preload_requires_cache(self):
+        self.settings.cache = None
+        with self.assertRaises(InvalidCall):
+            self.settings.preload('/app')
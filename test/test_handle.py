@@ -0,0 +1,82 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall.errors import InvalidCall, NoDefaultEnv
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class TestPathHandle(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache()
+                )
+        self.handle = self.settings.path(None, '/abc', override='guest')
+
+    def test_invalid_path(self):
+        with self.assertRaises(InvalidCall):
+            self.settings.path('dev', 'abc')
+
+    def test_requires_env(self):
+        self.settings.default_env = None
+        with self.assertRaises(NoDefaultEnv):
+            self.settings.path(None, '/abc')
+
+    @patch('requests.Session.get')
+    def test_reads(self, get):
+        url = self.url + 'env/dev/abc/'
+        get.return_value = build(update={'value': '1', 'protect': False})
+        self.assertEqual('1', self.handle.get())
+        self.assertEqual('1', self.handle.get())
+        get.assert_called_once_with(url, params={'override': 'guest'})
+        self.assertEqual('1', self.settings.get('/abc', override='guest'))
+        self.assertEqual(1, get.call_count)
+
+        get.return_value = build(update={'History': [], 'children': [
+            child('/abc/a/', '2')
+        ]})
+        self.assertEqual([], self.handle.history())
+        get.assert_called_with(
+            url, params={'override': 'guest', 'viewhistory': True}
+        )
+        self.assertEqual('2', self.handle.children()[0]['value'])
+        get.assert_called_with(
+            url, params={'override': 'guest', 'viewchildren': True}
+        )
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_writes(self, get, post):
+        url = self.url + 'env/dev/abc/'
+        get.return_value = build(update={'value': '1'})
+        post.return_value = build()
+        self.handle.get()
+        self.handle.set('2')
+        post.assert_called_once_with(
+            url, data={'value': '2'}, params={'override': 'guest'}
+        )
+        self.handle.set_protect(True)
+        post.assert_called_with(
+            url, data={'protect': True}, params={'override': 'guest'}
+        )
+        get.return_value = build(update={'value': '2'})
+        self.assertEqual('2', self.handle.get())
+        self.assertEqual(2, get.call_count)
@@ -0,0 +1,105 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings
+from cityhall.records import parse_datetime
+from datetime import datetime
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+def entry(entry_id, value, when):
+    return {
+        'active': False,
+        'override': '',
+        'id': entry_id,
+        'value': value,
+        'datetime': when,
+        'protect': False,
+        'name': 'abc',
+        'author': 'cityhall',
+    }
+
+
+class TestIterHistory(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+        self.history = build(update={'History': [
+            entry(10, '1', '2015-01-01T10:00:00'),
+            entry(11, '2', '2015-01-02T10:00:00.250000'),
+            entry(12, '3', '2015-01-03T10:00:00'),
+        ]})
+
+    def values(self, **kwargs):
+        return [
+            e['value'] for e in self.settings.iter_history('/abc', **kwargs)
+        ]
+
+    @patch('requests.Session.get')
+    def test_newest_first(self, get):
+        get.return_value = self.history
+        self.assertEqual(['3', '2', '1'], self.values())
+        get.assert_called_once_with(
+            self.url + 'env/dev/abc/', params={'viewhistory': True}
+        )
+
+    @patch('requests.Session.get')
+    def test_filters(self, get):
+        get.return_value = self.history
+        self.assertEqual(['3', '2'], self.values(limit=2))
+        self.assertEqual([], self.values(limit=0))
+        self.assertEqual(['3'], self.values(since_id=11))
+        since = datetime(2015, 1, 2, 10)
+        self.assertEqual(['3', '2'], self.values(since=since))
+        self.assertEqual(['3'], self.values(since=since, limit=1))
+
+    @patch('requests.Session.get')
+    def test_zero_limit_makes_no_call(self, get):
+        self.assertEqual([], self.values(limit=0))
+        self.assertEqual(0, get.call_count)
+
+    @patch('requests.Session.get')
+    def test_entries_out_of_order(self, get):
+        get.return_value = build(update={'History': [
+            entry(12, '3', '2015-01-03T10:00:00'),
+            entry(10, '1', '2015-01-01T10:00:00'),
+            entry(11, '2', '2015-01-02T10:00:00'),
+        ]})
+        self.assertEqual(['3', '2'], self.values(since_id=10))
+
+    @patch('requests.Session.get')
+    def test_entries_are_dicts(self, get):
+        get.return_value = self.history
+        newest = next(self.settings.iter_history('/abc', override='x'))
+        self.assertEqual(entry(12, '3', '2015-01-03T10:00:00'), newest)
+        get.assert_called_once_with(
+            self.url + 'env/dev/abc/',
+            params={'viewhistory': True, 'override': 'x'},
+        )
+
+    def test_parse_datetime(self):
+        self.assertEqual(
+            datetime(2015, 1, 2, 10, 0, 0, 250000),
+            parse_datetime('2015-01-02T10:00:00.250000'),
+        )
+        now = datetime.now()
+        self.assertIs(now, parse_datetime(now))
+        with self.assertRaises(ValueError):
+            parse_datetime('yesterday')
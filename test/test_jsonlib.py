@@ -0,0 +1,74 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall.jsonlib import find_fast_loads, load_reply
+from unittest import TestCase
+from helper_funcs import build
+from mock import MagicMock, patch
+import json
+
+
+class TestLoads(TestCase):
+    def test_find_fast_loads(self):
+        self.assertIsNone(find_fast_loads(('not_a_json_module',)))
+        self.assertIs(
+            json.loads, find_fast_loads(('not_a_json_module', 'json'))
+        )
+
+    def test_load_reply(self):
+        resp = build(update={'value': 'abc'})
+        self.assertEqual(
+            {'Response': 'Ok', 'value': 'abc'}, load_reply(resp, json.loads)
+        )
+        self.assertIs(resp.json.return_value, load_reply(resp))
+
+
+class TestSettingsLoads(TestCase):
+    def setUp(self):
+        self.loads = MagicMock(side_effect=json.loads)
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    'http://not.a.real.url/api/', 'test_user', '',
+                    cache=ValueCache(), json_loads=self.loads,
+                )
+
+    @patch('requests.Session.get')
+    def test_replies_use_json_loads(self, get):
+        get.return_value = build(update={'value': '42'})
+        self.assertEqual('42', self.settings.get('/abc'))
+        self.assertEqual(3, self.loads.call_count)
+        self.assertFalse(get.return_value.json.called)
+
+    @patch('requests.Session.get')
+    def test_plain_values_are_cached_as_replies(self, get):
+        body = {'Response': 'Ok', 'value': '42', 'protect': False}
+        get.return_value = build(update=body)
+        self.settings.get('/abc')
+        self.assertEqual(body, self.settings.get('/abc', view_raw=True))
+        self.assertEqual(1, get.call_count)
+
+    @patch('requests.Session.get')
+    def test_requests_decoding_by_default(self, get):
+        with patch('requests.Session.post') as post:
+            post.return_value = build()
+            get.return_value = build(update={'value': 'dev'})
+            settings = Settings('http://not.a.real.url/api/', 'test_user', '')
+        self.assertIsNone(settings.json_loads)
+        get.return_value = build(update={'value': '42'})
+        self.assertEqual('42', settings.get('/abc'))
+        self.assertTrue(get.return_value.json.called)
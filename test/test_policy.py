@@ -0,0 +1,124 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache, Stats, ReadPolicy, CircuitBreaker
+from cityhall.errors import FailedCall, InvalidCall, CircuitOpen
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+import requests
+import time
+
+
+class TestCircuitBreaker(TestCase):
+    def test_opens_and_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        with patch('cityhall.policy.time.time') as now:
+            now.return_value = 100
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+            self.assertFalse(breaker.allow())
+
+            now.return_value = 110
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+
+            now.return_value = 120
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+            self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+            self.assertTrue(breaker.allow())
+
+
+class TestReadPolicy(TestCase):
+    def settings(self, policy):
+        self.url = 'http://not.a.real.url/api/'
+        self.stats = Stats()
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                return Settings(
+                    self.url, 'test_user', '', cache=ValueCache(ttl=0),
+                    stats=self.stats, read_policy=policy,
+                )
+
+    def test_requires_cache(self):
+        with self.assertRaises(InvalidCall):
+            Settings('http://not.a.real.url/api/', 'test_user', '',
+                     lazy=True, read_policy=ReadPolicy())
+
+    @patch('requests.Session.get')
+    def test_stale_if_error(self, get):
+        settings = self.settings(ReadPolicy(stale_while_revalidate=False))
+        get.return_value = build(update={'value': '1'})
+        self.assertEqual('1', settings.get('/abc'))
+
+        get.side_effect = requests.ConnectionError()
+        self.assertEqual('1', settings.get('/abc'))
+        get.side_effect = None
+        get.return_value = build(status_code=503)
+        self.assertEqual('1', settings.get('/abc'))
+        self.assertEqual(2, self.stats.stale_served)
+
+        get.side_effect = requests.ConnectionError()
+        with self.assertRaises(requests.ConnectionError):
+            settings.get('/other')
+
+    @patch('requests.Session.get')
+    def test_refusals_are_not_served_stale(self, get):
+        settings = self.settings(ReadPolicy(stale_while_revalidate=False))
+        get.return_value = build(update={'value': '1'})
+        settings.get('/abc')
+        get.return_value = build('Failure', 'Value does not exist')
+        with self.assertRaises(FailedCall):
+            settings.get('/abc')
+        self.assertEqual(0, self.stats.stale_served)
+
+    @patch('requests.Session.get')
+    def test_open_circuit_stops_calls(self, get):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        policy = ReadPolicy(stale_while_revalidate=False, breaker=breaker)
+        settings = self.settings(policy)
+        get.return_value = build(update={'value': '1'})
+        settings.get('/abc')
+
+        get.side_effect = requests.Timeout()
+        settings.get('/abc')
+        settings.get('/abc')
+        self.assertEqual(3, get.call_count)
+        self.assertEqual('1', settings.get('/abc'))
+        with self.assertRaises(CircuitOpen):
+            settings.get('/other')
+        self.assertEqual(3, get.call_count)
+        self.assertIsInstance(policy.last_error, requests.Timeout)
+
+    @patch('requests.Session.get')
+    def test_stale_while_revalidate(self, get):
+        settings = self.settings(ReadPolicy())
+        get.return_value = build(update={'value': '1'})
+        self.assertEqual('1', settings.get('/abc'))
+
+        get.return_value = build(update={'value': '2'})
+        self.assertEqual('1', settings.get('/abc'))
+        deadline = time.time() + 5
+        while settings._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(2, get.call_count)
+        self.assertEqual('2', settings.get('/abc'))
+        self.assertEqual(2, self.stats.stale_served)
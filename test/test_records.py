@@ -0,0 +1,81 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall import records
+from cityhall.records import ChildRecord, HistoryRecord, compact, expand
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class TestRecords(TestCase):
+    def test_child_record(self):
+        row = child('/app/a/', '1', override='guest')
+        record = ChildRecord(row)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual('1', record['value'])
+        self.assertEqual('guest', record.get('override'))
+        self.assertIsNone(record.get('missing'))
+        self.assertEqual(row, record.as_dict())
+        with self.assertRaises(KeyError):
+            record['missing']
+
+    def test_identifiers_are_shared(self):
+        first = ChildRecord(child(u'/app/' + u'a/', '1'))
+        second = ChildRecord(child(u'/app/a' + u'/', '2'))
+        self.assertIs(first.path, second.path)
+        self.assertIs(first.name, second.name)
+
+    def test_shared_strings_are_bounded(self):
+        with patch('cityhall.records.MAX_SHARED_STRINGS', 4):
+            for i in range(20):
+                ChildRecord(child('/app/k{}/'.format(i), str(i)))
+                self.assertLessEqual(len(records._strings), 4)
+
+    def test_compact(self):
+        history = [{
+            'id': 1, 'override': '', 'value': '1', 'protect': False,
+            'active': True, 'datetime': '2015-01-01T00:00:00',
+            'name': 'a', 'author': 'cityhall',
+        }]
+        json = compact({'Response': 'Ok', 'History': history})
+        self.assertIsInstance(json['History'][0], HistoryRecord)
+        self.assertEqual(history, expand(json['History']))
+        plain = {'Response': 'Ok', 'value': '1'}
+        self.assertIs(plain, compact(plain))
+
+
+class TestCachedChildren(TestCase):
+    def setUp(self):
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    'http://not.a.real.url/api/', 'test_user', '',
+                    cache=ValueCache(),
+                )
+
+    @patch('requests.Session.get')
+    def test_children_are_cached_as_records(self, get):
+        rows = [child('/app/a/', '1'), child('/app/b/', '2')]
+        get.return_value = build(update={'children': rows})
+        first = self.settings.get_children('/app')
+        first[0]['value'] = 'changed'
+        second = self.settings.get_children('/app')
+        self.assertEqual(1, get.call_count)
+        self.assertEqual(rows, second)
+        cached = list(self.settings.cache._entries.values())[0][0]
+        self.assertIsInstance(cached['children'][0], ChildRecord)
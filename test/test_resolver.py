@@ -0,0 +1,87 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall.errors import InvalidCall
+from cityhall.resolver import OverrideIndex
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class TestOverrideIndex(TestCase):
+    def test_lookup(self):
+        index = OverrideIndex([
+            child('/app/a/', '1'),
+            child('/app/a/', '2', override='guest'),
+            child('/app/b/', '3', override='guest'),
+        ])
+        self.assertIn('/app/a', index)
+        self.assertEqual('2', index.lookup('/app/a', 'guest')['value'])
+        self.assertEqual('1', index.lookup('/app/a/', 'other')['value'])
+        self.assertEqual('1', index.lookup('/app/a/', '')['value'])
+        self.assertIsNone(index.lookup('/app/b/', 'other'))
+        self.assertIsNone(index.lookup('/app/c/', 'guest'))
+
+
+class TestResolve(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache()
+                )
+        self.children = build(update={'children': [
+            child('/app/a/', '1'),
+            child('/app/a/', '2', override='tenant1'),
+            child('/app/a/', '3', override='test_user'),
+        ]})
+
+    @patch('requests.Session.get')
+    def test_overrides_are_resolved_locally(self, get):
+        get.return_value = self.children
+        self.assertEqual('2', self.settings.resolve('/app/a', override='tenant1'))
+        self.assertEqual('1', self.settings.resolve('/app/a', override='tenant2'))
+        self.assertEqual('3', self.settings.resolve('/app/a'))
+        raw = self.settings.resolve('/app/a/', override='', view_raw=True)
+        self.assertEqual('1', raw['value'])
+        get.assert_called_once_with(
+            self.url + 'env/dev/app/', params={'viewchildren': True}
+        )
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_set_invalidates_index(self, get, post):
+        get.return_value = self.children
+        post.return_value = build()
+        self.settings.resolve('/app/a', override='tenant1')
+        self.settings.set('dev', '/app/a', 'tenant1', '4')
+        self.settings.resolve('/app/a', override='tenant1')
+        self.assertEqual(2, get.call_count)
+
+    @patch('requests.Session.get')
+    def test_unknown_children_use_get(self, get):
+        get.side_effect = [self.children, build(update={'value': '5'})]
+        self.assertEqual('5', self.settings.resolve('/app/b', override='x'))
+        get.assert_called_with(
+            self.url + 'env/dev/app/b/', params={'override': 'x'}
+        )
+
+    def test_resolve_requires_cache(self):
+        self.settings.cache = None
+        with self.assertRaises(InvalidCall):
+            self.settings.resolve('/app/a')
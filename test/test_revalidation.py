@@ -0,0 +1,101 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache, Stats
+from cityhall.cache import cache_key
+from benchmarks.fake_server import FakeCityHall
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+class TestExpiredEntries(TestCase):
+    def test_entries_with_etag_are_kept(self):
+        cache = ValueCache(ttl=10)
+        plain = cache_key('dev', '/a', None)
+        tagged = cache_key('dev', '/b', None)
+        with patch('cityhall.cache.time.time') as now:
+            now.return_value = 100
+            cache.set(plain, 'a')
+            cache.set(tagged, 'b', '"1"')
+            self.assertIsNone(cache.get_expired(plain))
+            now.return_value = 110
+            self.assertIsNone(cache.get(plain))
+            self.assertIsNone(cache.get(tagged))
+            self.assertEqual(('b', '"1"'), cache.get_expired(tagged))
+            cache.refresh(tagged)
+            self.assertEqual('b', cache.get(tagged))
+        self.assertEqual(1, len(cache))
+
+
+class TestRevalidation(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.stats = Stats()
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache(ttl=0),
+                    stats=self.stats,
+                )
+
+    @patch('requests.Session.get')
+    def test_not_modified_keeps_cached_reply(self, get):
+        first = build(update={'value': '42'})
+        first.headers = {'ETag': '"v1"'}
+        get.return_value = first
+        self.assertEqual(42, self.settings.get_int('/abc'))
+        get.assert_called_once_with(self.url + 'env/dev/abc/', params=None)
+
+        get.return_value = build(status_code=304)
+        self.assertEqual(42, self.settings.get_int('/abc'))
+        get.assert_called_with(
+            self.url + 'env/dev/abc/', params=None,
+            headers={'If-None-Match': '"v1"'},
+        )
+        self.assertEqual(1, self.stats.revalidations)
+        self.assertEqual(1, self.stats.not_modified)
+
+    @patch('requests.Session.get')
+    def test_modified_replaces_cached_reply(self, get):
+        first = build(update={'value': '1'})
+        first.headers = {'ETag': '"v1"'}
+        get.return_value = first
+        self.settings.get('/abc')
+        get.return_value = build(update={'value': '2'})
+        self.assertEqual('2', self.settings.get('/abc'))
+        self.assertEqual(1, self.stats.revalidations)
+        self.assertEqual(0, self.stats.not_modified)
+
+        # Without an ETag, the next call is not conditional
+        self.settings.get('/abc')
+        get.assert_called_with(self.url + 'env/dev/abc/', params=None)
+
+
+class TestFakeServerEtags(TestCase):
+    def test_revalidation_over_http(self):
+        with FakeCityHall() as server:
+            server.put('dev', '/app/a', '1')
+            settings = Settings(
+                server.url, 'cityhall', '', cache=ValueCache(ttl=0)
+            )
+            self.assertEqual('1', settings.get('/app/a'))
+            self.assertEqual('1', settings.get('/app/a'))
+            self.assertEqual(1, server.not_modified)
+            server.put('dev', '/app/a', '2')
+            self.assertEqual('2', settings.get('/app/a'))
+            self.assertEqual(1, server.not_modified)
+            settings.log_out()
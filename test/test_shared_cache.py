@@ -0,0 +1,154 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, SharedCache
+from cityhall.cache import cache_key
+from cityhall.errors import InvalidCall
+from cityhall.records import compact
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+
+
+class TestSharedCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_values_are_shared(self):
+        first = SharedCache(self.filename)
+        second = SharedCache(self.filename)
+        key = cache_key(u'dev', '/abc', {'viewchildren': True})
+        reply = compact({'Response': 'Ok', 'children': [child('/abc/a', '1')]})
+        first.set(key, reply, '"v1"')
+        self.assertEqual(
+            '1', second.get(('dev', '/abc/', (('viewchildren', True),)))
+            ['children'][0]['value']
+        )
+        self.assertEqual('"v1"', second.get_expired(key)[1])
+
+        second.invalidate('dev', '/abc/a')
+        self.assertIsNone(first.get(key))
+        self.assertEqual(0, len(first))
+
+    def test_expiry_and_eviction(self):
+        cache = SharedCache(self.filename, ttl=10, max_size=2)
+        with patch('cityhall.shared_cache.time.time') as now:
+            now.return_value = 100
+            cache.set(cache_key('dev', '/a', None), 'a')
+            now.return_value = 101
+            cache.set(cache_key('dev', '/b', None), 'b')
+            cache.set(cache_key('dev', '/c', None), 'c')
+            self.assertEqual(2, len(cache))
+            self.assertIsNone(cache.get(cache_key('dev', '/a', None)))
+
+            now.return_value = 111
+            self.assertIsNone(cache.get(cache_key('dev', '/b', None)))
+            self.assertIsNone(cache.get_expired(cache_key('dev', '/b', None)))
+            cache.keep_expired = True
+            self.assertEqual(
+                ('b', None), cache.get_expired(cache_key('dev', '/b', None))
+            )
+            cache.refresh(cache_key('dev', '/b', None))
+            self.assertEqual('b', cache.get(cache_key('dev', '/b', None)))
+
+    def test_lock_is_held_across_processes(self):
+        cache = SharedCache(self.filename)
+        lock = cache.lock(cache_key('dev', '/a', None))
+        with lock:
+            pid = os.fork()
+            if pid == 0:
+                fd = os.open(self.filename + '.lock', os.O_RDWR)
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1,
+                                lock.offset)
+                    os._exit(0)
+                except IOError:
+                    os._exit(1)
+            _, status = os.waitpid(pid, 0)
+        self.assertEqual(1, os.WEXITSTATUS(status))
+
+    def test_lock_is_held_across_threads(self):
+        cache = SharedCache(self.filename)
+        key = cache_key('dev', '/a', None)
+        entered = threading.Event()
+
+        def take():
+            with cache.lock(key):
+                entered.set()
+
+        thread = threading.Thread(target=take)
+        with cache.lock(key):
+            thread.start()
+            self.assertFalse(entered.wait(0.1))
+        thread.join()
+        self.assertTrue(entered.is_set())
+
+    def test_replacing_an_entry_evicts_nothing(self):
+        cache = SharedCache(self.filename, max_size=2)
+        cache.set(cache_key('dev', '/a', None), 'a')
+        cache.set(cache_key('dev', '/b', None), 'b', '"v1"')
+        cache.set(cache_key('dev', '/b', None), 'B', '"v2"')
+        self.assertEqual(2, len(cache))
+        self.assertEqual('a', cache.get(cache_key('dev', '/a', None)))
+        self.assertEqual(
+            ('B', '"v2"'), cache.get_expired(cache_key('dev', '/b', None))
+        )
+
+    @patch('requests.Session.get')
+    def test_settings_share_fetched_values(self, get):
+        with patch('requests.Session.post') as post:
+            post.return_value = build()
+            get.return_value = build(update={'value': 'dev'})
+            first, second = [
+                Settings('http://not.a.real.url/api/', 'test_user', '',
+                         cache=SharedCache(self.filename))
+                for _ in range(2)
+            ]
+        get.reset_mock()
+        get.return_value = build(update={'value': '1'})
+        self.assertEqual('1', first.get('/abc'))
+        self.assertEqual('1', second.get('/abc'))
+        self.assertEqual(1, get.call_count)
+
+    def test_files_are_private(self):
+        SharedCache(self.filename)
+        for name in (self.filename, self.filename + '.lock'):
+            self.assertEqual(0o600, os.stat(name).st_mode & 0o777)
+
+    def test_files_accessible_to_others_are_refused(self):
+        SharedCache(self.filename)
+        os.chmod(self.filename, 0o644)
+        with self.assertRaises(InvalidCall):
+            SharedCache(self.filename)
+        os.chmod(self.filename, 0o600)
+        os.chmod(self.filename + '.lock', 0o666)
+        with self.assertRaises(InvalidCall):
+            SharedCache(self.filename)
+
+    def test_after_fork_closes_lock_file(self):
+        cache = SharedCache(self.filename)
+        cache.after_fork()
+        before = len(os.listdir('/proc/self/fd'))
+        for _ in range(3):
+            cache.after_fork()
+        self.assertEqual(before, len(os.listdir('/proc/self/fd')))
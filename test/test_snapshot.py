@@ -0,0 +1,152 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings
+from cityhall.snapshot import Snapshot, write_snapshot
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+import os
+import requests
+import shutil
+import tempfile
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lookup(self):
+        values = {'/app/{}/'.format(i): str(i) for i in range(100)}
+        values['/app/none/'] = None
+        values['/app/text/'] = 'line\nbreak'
+        write_snapshot(self.filename, 'dev', '/app', None, values)
+
+        snapshot = Snapshot(self.filename)
+        self.assertTrue(snapshot.covers('dev', '/app/1', None))
+        self.assertFalse(snapshot.covers('qa', '/app/1', None))
+        self.assertFalse(snapshot.covers('dev', '/other/1', None))
+        self.assertFalse(snapshot.covers('dev', '/app/1', 'guest'))
+        for path, value in values.items():
+            self.assertEqual((True, value), snapshot.lookup(path))
+        self.assertEqual((True, '42'), snapshot.lookup('/app/42'))
+        self.assertEqual((False, None), snapshot.lookup('/app/100/'))
+        self.assertEqual((False, None), snapshot.lookup('/a/'))
+        self.assertEqual((False, None), snapshot.lookup('/b/'))
+        snapshot.close()
+
+    def test_empty_snapshot(self):
+        write_snapshot(self.filename, 'dev', '/app', None, {})
+        snapshot = Snapshot(self.filename)
+        self.assertEqual((False, None), snapshot.lookup('/app/a/'))
+        snapshot.close()
+
+
+class TestSettingsSnapshot(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'snapshot')
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+        write_snapshot(self.filename, 'dev', '/app', None, {'/app/a/': '1'})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    @patch('requests.Session.get')
+    def test_export_snapshot(self, get):
+        get.side_effect = lambda url, params=None: build(update={
+            'children': [child('/app/b/', '2')] if url.endswith('/app/') else []
+        })
+        self.settings.export_snapshot(self.filename, '/app')
+        self.assertEqual((True, '2'), Snapshot(self.filename).lookup('/app/b'))
+
+    @patch('requests.Session.get')
+    def test_get_is_served_from_snapshot(self, get):
+        get.return_value = build(update={'value': 'server'})
+        self.settings.load_snapshot(self.filename, refresh=False)
+
+        self.assertEqual('1', self.settings.get('/app/a'))
+        self.assertEqual(0, get.call_count)
+        self.assertEqual('server', self.settings.get('/app/a', env='qa'))
+        self.assertEqual('server', self.settings.get('/app/b'))
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_server_down_without_env(self, get, post):
+        get.side_effect = requests.ConnectionError()
+        post.side_effect = requests.ConnectionError()
+        settings = Settings(self.url, 'test_user', '', lazy=True)
+        settings.load_snapshot(self.filename, refresh=False)
+        self.assertEqual('1', settings.get('/app/a'))
+        self.assertEqual('1', settings.get('/app/a', env='dev'))
+        self.assertEqual(0, get.call_count + post.call_count)
+        with self.assertRaises(requests.ConnectionError):
+            settings.get('/app/b')
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_write_drops_snapshot(self, get, post):
+        post.return_value = build()
+        get.return_value = build(update={'value': 'NEW'})
+        self.settings.load_snapshot(self.filename, refresh=False)
+        snapshot = self.settings.snapshot
+
+        self.settings.set('qa', '/app/a', '', 'other')
+        self.settings.set('dev', '/other', '', 'other')
+        self.assertIs(snapshot, self.settings.snapshot)
+
+        self.settings.set('dev', '/app/a', '', 'NEW')
+        self.assertIsNone(self.settings.snapshot)
+        self.assertTrue(snapshot.closed)
+        self.assertEqual((False, None), snapshot.lookup('/app/a'))
+        self.assertEqual('NEW', self.settings.get('/app/a'))
+
+    def test_loading_closes_previous_snapshot(self):
+        self.settings.load_snapshot(self.filename, refresh=False)
+        previous = self.settings.snapshot
+        self.settings.load_snapshot(self.filename, refresh=False)
+        self.assertTrue(previous.closed)
+        self.assertFalse(self.settings.snapshot.closed)
+
+    @patch('requests.Session.get')
+    def test_failed_refresh_keeps_snapshot(self, get):
+        get.return_value = build(reply='Failure', message='Server is down')
+        self.settings.load_snapshot(self.filename).join()
+        self.assertEqual('1', self.settings.get('/app/a'))
+
+    @patch('requests.Session.get')
+    def test_refresh_rewrites_snapshot(self, get):
+        rows = [child('/app/a/', '2')]
+        get.side_effect = lambda url, params=None: build(update={
+            'children': rows if url.endswith('/app/') else []
+        })
+        loaded = []
+
+        def load(filename):
+            loaded.append(Snapshot(filename))
+            return loaded[-1]
+        with patch('cityhall.Snapshot', side_effect=load):
+            self.settings.load_snapshot(self.filename).join()
+        self.assertIsNone(self.settings.snapshot)
+        self.assertTrue(loaded[0].closed)
+        self.assertEqual((True, '2'), Snapshot(self.filename).lookup('/app/a'))
@@ -0,0 +1,94 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, Stats, ValueCache
+from cityhall.errors import FailedCall
+from cityhall.stats import LATENCY_BUCKETS
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+class TestStats(TestCase):
+    def test_record_call(self):
+        stats = Stats()
+        stats.record_call('get', 0.002, 10, None)
+        stats.record_call('get', 20, 5, FailedCall())
+        stats.record_call('set', 0.0001, 0, None, sent=12)
+
+        numbers = stats.as_dict()['endpoints']
+        self.assertEqual(2, numbers['get']['calls'])
+        self.assertEqual(15, numbers['get']['bytes'])
+        self.assertEqual(20, numbers['get']['max_seconds'])
+        self.assertEqual({'FailedCall': 1}, numbers['get']['errors'])
+        self.assertEqual(1, numbers['get']['latencies'][1])
+        self.assertEqual(1, numbers['get']['latencies'][len(LATENCY_BUCKETS)])
+        self.assertEqual(1, numbers['set']['latencies'][0])
+        self.assertEqual(0, numbers['get']['bytes_sent'])
+        self.assertEqual(12, numbers['set']['bytes_sent'])
+
+    def test_cache_hit_rate(self):
+        stats = Stats()
+        self.assertEqual(0.0, stats.cache_hit_rate)
+        stats.record_cache(True)
+        stats.record_cache(True)
+        stats.record_cache(False)
+        stats.record_cache(True)
+        self.assertEqual(0.75, stats.cache_hit_rate)
+
+
+class TestSettingsStats(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        self.stats = Stats()
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache(),
+                    stats=self.stats
+                )
+
+    def test_login_is_recorded(self):
+        endpoints = self.stats.as_dict()['endpoints']
+        self.assertEqual(1, endpoints['auth']['calls'])
+        self.assertEqual(1, endpoints['default_env']['calls'])
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_calls_are_recorded(self, get, post):
+        calls = []
+        self.settings.add_listener(lambda *args: calls.append(args))
+        get.return_value = build(update={'value': '1', 'children': []})
+        post.return_value = build(reply='Failure', message='No rights')
+
+        self.settings.get('/abc')
+        self.settings.get('/abc')
+        self.settings.get_children('/abc')
+        with self.assertRaises(FailedCall):
+            self.settings.set('dev', '/abc', '', '2')
+
+        endpoints = self.stats.as_dict()['endpoints']
+        self.assertEqual(1, endpoints['get']['calls'])
+        self.assertEqual(1, endpoints['children']['calls'])
+        self.assertEqual({'FailedCall': 1}, endpoints['set']['errors'])
+        self.assertEqual(0, endpoints['get']['bytes_sent'])
+        self.assertEqual(len('value=2'), endpoints['set']['bytes_sent'])
+        self.assertEqual(1, self.stats.cache_hits)
+        self.assertEqual(2, self.stats.cache_misses)
+
+        self.assertEqual(['get', 'children', 'set'], [c[0] for c in calls])
+        self.assertIsNone(calls[0][3])
+        self.assertIsInstance(calls[2][3], FailedCall)
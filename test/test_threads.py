@@ -0,0 +1,135 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, ValueCache
+from cityhall.errors import FailedCall
+from cityhall.workers import fan_out, SingleFlight
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+import threading
+
+
+class TestSharedSettings(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(
+                    self.url, 'test_user', '', cache=ValueCache()
+                )
+
+    def test_threads_share_pool_and_login(self):
+        sessions = []
+        thread = threading.Thread(
+            target=lambda: sessions.append(self.settings.session)
+        )
+        thread.start()
+        thread.join()
+
+        mine = self.settings.session
+        self.assertIs(mine, self.settings.session)
+        self.assertIsNot(mine, sessions[0])
+        self.assertIs(mine.cookies, sessions[0].cookies)
+        self.assertIs(
+            mine.get_adapter(self.url), sessions[0].get_adapter(self.url)
+        )
+
+    @patch('requests.Session.get')
+    def test_concurrent_gets(self, get):
+        get.side_effect = lambda url, params=None: build(
+            update={'value': url[len(self.url):]}
+        )
+        paths = ['/val{}'.format(i % 10) for i in range(200)]
+        results = fan_out(self.settings.get, paths, max_workers=16)
+        for path, (value, error) in zip(paths, results):
+            self.assertIsNone(error)
+            self.assertEqual('env/dev' + path + '/', value)
+        self.assertEqual(10, len(self.settings.cache))
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+
+    def test_calls_are_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(1)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(flight.do('key', slow))
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(1000):
+            if flight.coalesced == 7:
+                break
+            release.wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(['value'] * 8, results)
+        self.assertEqual('value', flight.do('key', lambda: 'value'))
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise FailedCall('Some message')
+        with self.assertRaises(FailedCall):
+            flight.do('key', fail)
+        self.assertEqual('value', flight.do('key', lambda: 'value'))
+
+    @patch('requests.Session.get')
+    def test_identical_gets_share_one_call(self, get):
+        release = threading.Event()
+
+        def reply(url, params=None):
+            release.wait(1)
+            return build(update={'value': '1'})
+        get.side_effect = reply
+
+        results = []
+        thread = threading.Thread(target=lambda: results.extend(fan_out(
+            lambda path: self.settings.get(path), ['/abc'] * 8, max_workers=8
+        )))
+        thread.start()
+        for _ in range(1000):
+            if self.settings._inflight.coalesced == 7:
+                break
+            release.wait(0.001)
+        release.set()
+        thread.join()
+
+        self.assertEqual([('1', None)] * 8, results)
+        self.assertEqual(1, get.call_count)
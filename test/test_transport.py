@@ -0,0 +1,91 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, Transport
+from cityhall.errors import ServerError
+from benchmarks.fake_server import FakeCityHall
+from unittest import TestCase
+from helper_funcs import build
+from mock import patch
+
+
+class TestTransport(TestCase):
+    def test_adapter_settings(self):
+        transport = Transport(
+            pool_connections=2, pool_maxsize=32, retries=3, backoff_factor=1
+        )
+        session = transport.build_session()
+        adapter = session.get_adapter('http://not.a.real.url/')
+        self.assertIs(adapter, session.get_adapter('https://not.a.real.url/'))
+        self.assertEqual(2, adapter._pool_connections)
+        self.assertEqual(32, adapter._pool_maxsize)
+        self.assertEqual(3, adapter.max_retries.total)
+        self.assertEqual(1, adapter.max_retries.backoff_factor)
+        self.assertNotIn('close', session.headers.values())
+
+    def test_no_keep_alive(self):
+        session = Transport(keep_alive=False).build_session()
+        self.assertEqual('close', session.headers['Connection'])
+
+    @patch('requests.adapters.HTTPAdapter.send')
+    def test_default_timeout_is_applied(self, send):
+        adapter = Transport(timeout=7).build_adapter()
+        adapter.send('request', timeout=None)
+        send.assert_called_once_with('request', timeout=7)
+        adapter.send('request', timeout=1)
+        send.assert_called_with('request', timeout=1)
+
+    def test_settings_uses_transport(self):
+        transport = Transport(pool_maxsize=20)
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                settings = Settings(
+                    'http://not.a.real.url/api/', 'test_user', '',
+                    transport=transport
+                )
+        adapter = settings.session.get_adapter('http://not.a.real.url/')
+        self.assertEqual(20, adapter._pool_maxsize)
+
+
+class TestErrorStatusesOverHttp(TestCase):
+    """
+    Error statuses must reach Settings as ServerError, whether or not the
+    transport retries them.  Only real HTTP goes through the retry logic.
+    """
+    def setUp(self):
+        self.server = FakeCityHall().start()
+        self.server.put('dev', '/app/a', '1')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_without_retries(self):
+        settings = Settings(self.server.url, 'cityhall', '')
+        self.server.error_status = 503
+        self.server.requests = 0
+        with self.assertRaises(ServerError):
+            settings.get('/app/a')
+        self.assertEqual(1, self.server.requests)
+
+    def test_retries_exhausted(self):
+        transport = Transport(retries=2, backoff_factor=0)
+        settings = Settings(self.server.url, 'cityhall', '',
+                            transport=transport)
+        self.server.error_status = 502
+        self.server.requests = 0
+        with self.assertRaises(ServerError):
+            settings.get('/app/a')
+        self.assertEqual(3, self.server.requests)
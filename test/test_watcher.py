@@ -0,0 +1,136 @@
+# Copyright 2015 Digital Borderlands Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from cityhall import Settings, Watcher, ValueCache
+from cityhall.errors import FailedCall
+from unittest import TestCase
+from helper_funcs import build, child
+from mock import patch
+
+
+class TestWatcher(TestCase):
+    def setUp(self):
+        self.url = 'http://not.a.real.url/api/'
+        with patch('requests.Session.post') as post:
+            with patch('requests.Session.get') as get:
+                post.return_value = build()
+                get.return_value = build(update={'value': 'dev'})
+                self.settings = Settings(self.url, 'test_user', '')
+        self.watcher = Watcher(self.settings, interval=0.01)
+        self.changes = []
+        self.callback = lambda *args: self.changes.append(args)
+
+    def tearDown(self):
+        self.watcher.stop()
+
+    @patch('requests.Session.get')
+    def test_watched_path_is_served_from_memory(self, get):
+        get.return_value = build(update={'value': '1'})
+        self.watcher.watch('/abc', callback=self.callback)
+        self.assertEqual('1', self.watcher.get('/abc/'))
+        self.assertEqual(1, get.call_count)
+
+        get.return_value = build(update={'value': '2'})
+        self.watcher.refresh()
+        self.assertEqual('2', self.watcher.get('/abc'))
+        self.assertEqual([('/abc/', '1', '2')], self.changes)
+
+        self.watcher.refresh()
+        self.assertEqual(1, len(self.changes))
+
+    @patch('requests.Session.get')
+    def test_watched_subtree(self, get):
+        rows = [child('/app/a/', '1'), child('/app/b/', '2')]
+        get.side_effect = lambda url, params=None: build(update={
+            'children': list(rows) if url.endswith('/app/') else []
+        })
+        self.watcher.watch('/app', subtree=True, callback=self.callback)
+        self.assertEqual('1', self.watcher.get('/app/a'))
+
+        rows[0] = child('/app/c/', '3')
+        self.watcher.refresh()
+        self.assertEqual('3', self.watcher.get('/app/c'))
+        self.assertEqual(
+            sorted([('/app/a/', '1', None), ('/app/c/', None, '3')]),
+            sorted(self.changes)
+        )
+
+    @patch('requests.Session.get')
+    def test_overlapping_watches(self, get):
+        values = {'/app/a/': '1'}
+
+        def reply(url, params=None):
+            if params and params.get('viewchildren'):
+                return build(update={'children': [
+                    child(p, v) for p, v in values.items()
+                    if url.endswith('/app/')
+                ]})
+            return build(update={'value': values['/app/a/']})
+        get.side_effect = reply
+        leaf_changes = []
+        self.watcher.watch('/app', subtree=True, callback=self.callback)
+        self.watcher.watch(
+            '/app/a', callback=lambda *args: leaf_changes.append(args)
+        )
+
+        values['/app/a/'] = '2'
+        self.watcher.refresh()
+        self.assertEqual([('/app/a/', '1', '2')], self.changes)
+        self.assertEqual([('/app/a/', '1', '2')], leaf_changes)
+
+        self.watcher.unwatch('/app/a')
+        calls = get.call_count
+        self.assertEqual('2', self.watcher.get('/app/a'))
+        self.assertEqual(calls, get.call_count)
+
+    @patch('requests.Session.get')
+    def test_refresh_bypasses_the_cache(self, get):
+        self.settings.cache = ValueCache(ttl=60)
+        get.return_value = build(update={'value': '1'})
+        self.watcher.watch('/abc', callback=self.callback)
+
+        get.return_value = build(update={'value': '2'})
+        self.watcher.refresh()
+        self.assertEqual([('/abc/', '1', '2')], self.changes)
+        self.assertEqual('2', self.settings.get('/abc'))
+
+    @patch('requests.Session.get')
+    def test_failed_refresh_keeps_values(self, get):
+        get.return_value = build(update={'value': '1'})
+        self.watcher.watch('/abc')
+        get.return_value = build(reply='Failure', message='Server is down')
+        self.watcher.refresh()
+        self.assertEqual('1', self.watcher.get('/abc'))
+        self.assertIsInstance(self.watcher.last_error, FailedCall)
+
+    @patch('requests.Session.get')
+    def test_background_refresh(self, get):
+        get.return_value = build(update={'value': '1'})
+        self.watcher.watch('/abc', callback=self.callback)
+        get.return_value = build(update={'value': '2'})
+        self.watcher.start()
+        for _ in range(500):
+            if self.changes:
+                break
+            self.watcher._stopped.wait(0.01)
+        self.watcher.stop()
+        self.assertEqual(('/abc/', '1', '2'), self.changes[0])
+
+    @patch('requests.Session.get')
+    def test_unwatched_paths_are_fetched(self, get):
+        get.return_value = build(update={'value': '1'})
+        self.watcher.watch('/abc')
+        self.watcher.unwatch('/abc')
+        self.watcher.get('/abc')
+        self.assertEqual(2, get.call_count)